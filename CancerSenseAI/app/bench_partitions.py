@@ -0,0 +1,156 @@
+"""
+Benchmark history queries on an unpartitioned vs a monthly partitioned table.
+
+Two scratch copies of prediction_history are filled with the same synthetic
+rows. By default that's 10^7 rows spread evenly over 36 months and 10,000
+users. The plain copy is laid out as before the migration: primary key (id)
+and an index on user_id only. The other copy is migrated by PartitionManager,
+which also adds the (user_id, timestamp) index. The benchmark then times,
+over random users:
+
+  * before: the old history query, all of a user's rows on the plain table,
+  * the hot-path query on the plain table, to separate the effect of the
+    date bound from that of partitioning,
+  * after:  the hot-path query, the last HOT_MONTHS months on the partitioned
+            table once older partitions have been archived and dropped.
+
+The last two differ in both the index and the partitioning, so their gap is
+not down to partitioning alone. It also prints the EXPLAIN partition list,
+which shows the pruning. The scratch tables and the archive files written
+under archive/bench_history_partitioned are removed at the end unless --keep
+is passed.
+
+    python app/bench_partitions.py --rows 10000000 --queries 200
+"""
+import argparse
+import datetime
+import json
+import random
+import shutil
+import time
+
+from database import Database
+from partitions import HOT_MONTHS, PartitionManager, hot_cutoff, month_start
+from telemetry import percentile
+
+
+FLAT = "bench_history_flat"
+PARTITIONED = "bench_history_partitioned"
+ARCHIVE_DIR = f"archive/{PARTITIONED}"
+COLUMNS = "user_id, prediction, confidence_benign, confidence_malicious, input_data, notes, timestamp"
+INPUT_DATA = json.dumps({f"feature_{i}": 0.5 for i in range(30)})
+
+
+def create_tables(db):
+    # Both start as the unpartitioned table; PartitionManager.migrate converts one of them
+    for table in (FLAT, PARTITIONED):
+        db.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        db.cursor.execute(f"""
+            CREATE TABLE {table} (
+                id BIGINT NOT NULL AUTO_INCREMENT,
+                user_id INT NOT NULL,
+                prediction VARCHAR(10),
+                confidence_benign FLOAT,
+                confidence_malicious FLOAT,
+                input_data JSON,
+                notes TEXT,
+                timestamp DATETIME NOT NULL,
+                confirmed_diagnosis VARCHAR(10),
+                PRIMARY KEY (id),
+                INDEX idx_user (user_id)
+            )
+        """)
+
+
+def fill(db, rows, users, months, batch_size, seed=42):
+    """Insert the same rows into both tables, in batches"""
+    rng = random.Random(seed)
+    end = datetime.datetime.now()
+    span_seconds = months * 30 * 86400
+    query = "INSERT INTO {} (" + COLUMNS + ") VALUES (%s, %s, %s, %s, %s, %s, %s)"
+    start = time.perf_counter()
+    for offset in range(0, rows, batch_size):
+        batch = []
+        for _ in range(min(batch_size, rows - offset)):
+            malignant = rng.random()
+            batch.append((
+                rng.randrange(1, users + 1), 'Malignant' if malignant > 0.5 else 'Benign',
+                1 - malignant, malignant, INPUT_DATA, None,
+                end - datetime.timedelta(seconds=rng.randrange(span_seconds)),
+            ))
+        for table in (FLAT, PARTITIONED):
+            db.cursor.executemany(query.format(table), batch)
+        db.conn.commit()
+        done = offset + len(batch)
+        if done % (batch_size * 100) == 0 or done == rows:
+            print(f"  {done:>12,} rows ({done / (time.perf_counter() - start):,.0f} rows/s)")
+
+
+def time_queries(db, query, users, n, params=lambda user: (user,), seed=7):
+    rng = random.Random(seed)
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        db.cursor.execute(query, params(rng.randrange(1, users + 1)))
+        db.cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history queries before and after partitioning")
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--months', type=int, default=36, help='age of the oldest synthetic row')
+    parser.add_argument('--queries', type=int, default=200, help='history queries timed per variant')
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch tables')
+    args = parser.parse_args()
+
+    db = Database()
+    db.ensure_connection()
+    create_tables(db)
+
+    print(f"Loading {args.rows:,} rows into both tables")
+    fill(db, args.rows, args.users, args.months, args.batch_size)
+
+    print("Partitioning and archiving")
+    manager = PartitionManager(db, table=PARTITIONED, archive_dir=ARCHIVE_DIR)
+    start = time.perf_counter()
+    manager.migrate()
+    partitioned = time.perf_counter()
+    archived = manager.archive(HOT_MONTHS)
+    done = time.perf_counter()
+    print(f"  migrate {partitioned - start:.1f} s, archived {sum(rows for _, rows in archived):,} rows "
+          f"from {len(archived)} partitions in {done - partitioned:.1f} s")
+
+    history = "SELECT id, prediction, confidence_benign, confidence_malicious, input_data, notes, timestamp, confirmed_diagnosis FROM {} WHERE user_id = %s"
+    since = datetime.datetime.combine(hot_cutoff(), datetime.time.min)
+    variants = [
+        ("before: full history, plain", history.format(FLAT) + " ORDER BY timestamp DESC", lambda u: (u,)),
+        ("hot window, plain", history.format(FLAT) + " AND timestamp >= %s ORDER BY timestamp DESC", lambda u: (u, since)),
+        ("after: hot window, part.+index", history.format(PARTITIONED) + " AND timestamp >= %s ORDER BY timestamp DESC", lambda u: (u, since)),
+    ]
+
+    db.cursor.execute(f"EXPLAIN {variants[2][1]}", (1, since))
+    columns = [c[0] for c in db.cursor.description]
+    print(f"\nPartitions scanned by the hot-path query: {dict(zip(columns, db.cursor.fetchone()))['partitions']}")
+
+    print(f"\n{'query':<40}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    print("-"*70)
+    for name, query, params in variants:
+        timings = time_queries(db, query, args.users, args.queries, params)
+        print(f"{name:<40}" + "".join(f"{percentile(timings, q) * 1000:>10.2f}" for q in (50, 95, 99)))
+
+    first = month_start(datetime.date.today() - datetime.timedelta(days=args.months * 30))
+    print(f"\nSynthetic data spans {first:%Y-%m} to {datetime.date.today():%Y-%m}; "
+          f"the partitioned table keeps the {HOT_MONTHS} months from {hot_cutoff():%Y-%m}.")
+
+    if not args.keep:
+        for table in (FLAT, PARTITIONED):
+            db.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        shutil.rmtree(ARCHIVE_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,36 +3,170 @@ from mysql.connector import Error
 import bcrypt
 import re
 import json
+import datetime
+import threading
+from contextlib import closing
+from replicas import replica_lag, router
+from telemetry import get_logger, span
+
+logger = get_logger("database")
+
+
+def open_connection(endpoint):
+    host, port = endpoint
+    return mysql.connector.connect(
+        host=host,
+        user="root",  # Replace with your MySQL username
+        password="root",  # Replace with your MySQL password
+        database="cancer_prediction_db",
+        port=port
+    )
+
+
+class ConnectionPool:
+    """
+    Idle connections per endpoint, shared by every Database in the process.
+
+    The app creates a Database per call site on every rerun, so each one
+    borrows its connections from here and gives them back when it is
+    released, instead of paying a TCP and auth handshake per instance.
+    """
+
+    def __init__(self, max_idle=8):
+        self.max_idle = max_idle
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def get(self, endpoint):
+        while True:
+            with self.lock:
+                idle = self.idle.get(endpoint)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                return open_connection(endpoint)
+            if conn.is_connected():
+                return conn
+
+    def put(self, endpoint, conn):
+        try:
+            # End the open transaction, so the next borrower doesn't read an old snapshot
+            conn.rollback()
+            with self.lock:
+                idle = self.idle.setdefault(endpoint, [])
+                if len(idle) < self.max_idle:
+                    idle.append(conn)
+                    return
+            conn.close()
+        except Error:
+            pass
+
+
+pool = ConnectionPool()
+
 
 class Database:
     def __init__(self):
+        # Connections are borrowed on first use: a Database that only reads
+        # from replicas never connects to the primary
         self.conn = None
         self.cursor = None
-        try:
-            self.conn = mysql.connector.connect(
-                host="localhost",
-                user="root",  # Replace with your MySQL username
-                password="root",  # Replace with your MySQL password
-                database="cancer_prediction_db",
-                port=3309
-            )
-            if self.conn.is_connected():
-                self.cursor = self.conn.cursor(buffered=True)
-            else:
-                raise Error("Failed to connect to database")
-        except Error as e:
-            raise Exception(f"Error connecting to MySQL: {e}")
+        self.replica_conns = {}
+
+    def connect(self, endpoint):
+        return open_connection(endpoint)
 
     def ensure_connection(self):
-        """Ensure the connection is active, reconnect if necessary"""
+        """Borrow a primary connection if this instance has none, replacing it if it dropped"""
         try:
-            if not self.conn or not self.conn.is_connected():
-                self.__init__()
+            if self.conn and not self.conn.is_connected():
+                self.conn = self.cursor = None
+            if not self.conn:
+                self.conn = pool.get(router.primary)
             if not self.cursor:
                 self.cursor = self.conn.cursor(buffered=True)
         except Error as e:
             raise Exception(f"Database connection error: {e}")
 
+    def _route(self, keys):
+        """
+        The replica (and its connection) to serve a read about `keys`, or
+        (None, None) when no replica is reachable, fresh enough and past this
+        reader's latest write
+        """
+        for replica in router.candidates():
+            try:
+                if replica not in self.replica_conns:
+                    self.replica_conns[replica] = pool.get(replica)
+                conn = self.replica_conns[replica]
+                if router.needs_check(replica):
+                    with closing(conn.cursor(buffered=True)) as cursor:
+                        router.set_lag(replica, replica_lag(cursor))
+                if not router.usable(replica):
+                    continue
+                if not self._caught_up(conn, router.pending_writes(keys)):
+                    router.count('sticky')
+                    continue
+            except Error as e:
+                self._drop_replica(replica)
+                router.mark_down(replica, e)
+                continue
+            return replica, conn
+        return None, None
+
+    def _drop_replica(self, replica):
+        conn = self.replica_conns.pop(replica, None)
+        if conn:
+            try:
+                conn.close()
+            except Error:
+                pass
+
+    def _caught_up(self, conn, gtid_sets):
+        """Whether the replica behind `conn` has applied every one of these primary GTID sets"""
+        if not gtid_sets:
+            return True
+        if not all(gtid_sets):
+            # Written without GTIDs: nothing to compare, so stay on the primary
+            return False
+        with closing(conn.cursor(buffered=True)) as cursor:
+            for gtid_set in gtid_sets:
+                cursor.execute("SELECT GTID_SUBSET(%s, @@GLOBAL.gtid_executed)", (gtid_set,))
+                if not cursor.fetchone()[0]:
+                    return False
+        return True
+
+    def note_write(self, *keys):
+        """Record the primary's position after a write, so reads under `keys` wait for replicas to reach it"""
+        if not router.replicas:
+            return
+        self.ensure_connection()
+        self.cursor.execute("SELECT @@GLOBAL.gtid_executed")
+        router.note_write(keys, self.cursor.fetchone()[0] or '')
+
+    def read_target(self, keys):
+        replica, _ = self._route(keys)
+        return f"replica {replica[0]}:{replica[1]}" if replica else "primary"
+
+    def _read(self, stage, query, params, keys, one=False):
+        """Run a read-only query on a replica when possible, falling back to the primary"""
+        replica, conn = self._route(keys)
+        if replica:
+            try:
+                with span(stage), closing(conn.cursor(buffered=True)) as cursor:
+                    cursor.execute(query, params)
+                    result = cursor.fetchone() if one else cursor.fetchall()
+                router.count('replica')
+                return result
+            except Error as e:
+                self._drop_replica(replica)
+                router.mark_down(replica, e)
+        self.ensure_connection()
+        with span(stage):
+            self.cursor.execute(query, params)
+            result = self.cursor.fetchone() if one else self.cursor.fetchall()
+        router.count('primary')
+        return result
+
     def validate_email(self, email):
         pattern = r'^[\w\.-]+@[\w\.-]+\.\w+$'
         return re.match(pattern, email) is not None
@@ -54,8 +188,10 @@ class Database:
                 return False, "Password must be at least 8 characters and contain uppercase, lowercase, and numbers"
 
             # Check if username or email already exists
-            self.cursor.execute("SELECT * FROM users WHERE username = %s OR email = %s", (username, email))
-            if self.cursor.fetchone():
+            with span("db.register_user.lookup"):
+                self.cursor.execute("SELECT * FROM users WHERE username = %s OR email = %s", (username, email))
+                existing = self.cursor.fetchone()
+            if existing:
                 return False, "Username or email already exists"
 
             # Hash the password
@@ -63,39 +199,55 @@ class Database:
             
             # Insert new user
             sql = "INSERT INTO users (username, email, password) VALUES (%s, %s, %s)"
-            self.cursor.execute(sql, (username, email, hashed_password))
-            self.conn.commit()
+            with span("db.register_user.insert"):
+                self.cursor.execute(sql, (username, email, hashed_password))
+                self.conn.commit()
+            self.note_write(f"username:{username}")
+            logger.info("User registered", extra={'username': username})
             return True, "Registration successful"
         except Error as e:
+            logger.error("Error registering user", extra={'username': username, 'error': str(e)})
             return False, f"Error: {str(e)}"
 
     def login_user(self, username, password):
         try:
-            self.ensure_connection()
-            self.cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-            user = self.cursor.fetchone()
+            user = self._read(
+                "db.login_user", "SELECT * FROM users WHERE username = %s", (username,),
+                [f"username:{username}"], one=True
+            )
             
             if user and bcrypt.checkpw(password.encode('utf-8'), user[3].encode('utf-8')):
                 return True, "Login successful"
+            logger.info("Failed login", extra={'username': username})
             return False, "Invalid username or password"
         except Error as e:
+            logger.error("Error logging in", extra={'username': username, 'error': str(e)})
             return False, f"Database error: {str(e)}"
 
-    def get_user_history(self, user_id):
-        """Retrieve prediction history for a user"""
+    def get_user_history(self, user_id, since=None, until=None):
+        """
+        Retrieve prediction history for a user, optionally only from `since`
+        up to and including `until` (dates). A lower bound lets MySQL skip
+        the older monthly partitions of prediction_history.
+        """
         try:
-            self.ensure_connection()
             query = """
                 SELECT id, prediction, confidence_benign, confidence_malicious, 
-                       input_data, notes, timestamp 
+                       input_data, notes, timestamp, confirmed_diagnosis 
                 FROM prediction_history 
                 WHERE user_id = %s 
-                ORDER BY timestamp DESC
             """
-            self.cursor.execute(query, (user_id,))
-            return self.cursor.fetchall()
+            params = [user_id]
+            if since is not None:
+                query += " AND timestamp >= %s"
+                params.append(datetime.datetime.combine(since, datetime.time.min))
+            if until is not None:
+                query += " AND timestamp < %s"
+                params.append(datetime.datetime.combine(until + datetime.timedelta(days=1), datetime.time.min))
+            query += " ORDER BY timestamp DESC"
+            return self._read("db.get_user_history", query, params, [f"user:{user_id}"])
         except Error as e:
-            print(f"Error retrieving history: {str(e)}")
+            logger.error("Error retrieving history", extra={'user_id': user_id, 'error': str(e)})
             return []
 
     def save_prediction(self, user_id, prediction, confidence_benign, confidence_malicious, input_data, notes):
@@ -103,11 +255,6 @@ class Database:
         try:
             self.ensure_connection()
             
-            # Debug prints
-            print(f"Saving prediction for user_id: {user_id}")
-            print(f"Prediction: {prediction}")
-            print(f"Confidence values: {confidence_benign}, {confidence_malicious}")
-            
             # Convert numpy float64 to Python float
             confidence_benign = float(confidence_benign)
             confidence_malicious = float(confidence_malicious)
@@ -121,28 +268,187 @@ class Database:
                 VALUES (%s, %s, %s, %s, %s, %s)
             """
             params = (user_id, prediction, confidence_benign, confidence_malicious, json.dumps(input_data), notes)
-            print(f"Query params: {params}")
             
-            self.cursor.execute(query, params)
-            self.conn.commit()
+            with span("db.save_prediction"):
+                self.cursor.execute(query, params)
+                self.conn.commit()
+            self.last_prediction_id = self.cursor.lastrowid
+            self.note_write(f"user:{user_id}")
+            logger.info("Prediction saved", extra={
+                'user_id': user_id, 'prediction_id': self.last_prediction_id, 'prediction': prediction,
+                'confidence_benign': confidence_benign, 'confidence_malicious': confidence_malicious
+            })
             return True, "Prediction saved successfully"
         except Error as e:
-            print(f"Database error: {str(e)}")
+            logger.error("Error saving prediction", extra={'user_id': user_id, 'error': str(e)})
             return False, f"Error saving prediction: {str(e)}"
 
+    def has_feedback_columns(self):
+        """Whether prediction_history has the confirmed-outcome columns (added by app/migrate.py)"""
+        self.ensure_connection()
+        self.cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = 'prediction_history'
+              AND column_name = 'confirmed_diagnosis'
+        """)
+        return bool(self.cursor.fetchone()[0])
+
+    def ensure_feedback_columns(self):
+        """Add the confirmed-outcome columns to prediction_history if they are missing"""
+        if self.has_feedback_columns():
+            return
+        self.cursor.execute("""
+            ALTER TABLE prediction_history
+                ADD COLUMN confirmed_diagnosis VARCHAR(10) NULL,
+                ADD COLUMN confirmed_at DATETIME NULL,
+                ADD INDEX idx_confirmed_at (confirmed_at, id)
+        """)
+        self.conn.commit()
+        logger.info("Added confirmed-outcome columns to prediction_history")
+
+    def confirm_diagnosis(self, prediction_id, user_id, diagnosis):
+        """Attach the confirmed diagnosis (or None to clear it) to one of the user's saved predictions"""
+        try:
+            self.ensure_connection()
+            if diagnosis not in ('Benign', 'Malignant', None):
+                return False, "Diagnosis must be Benign or Malignant"
+            query = """
+                UPDATE prediction_history
+                SET confirmed_diagnosis = %s, confirmed_at = IF(%s IS NULL, NULL, NOW())
+                WHERE id = %s AND user_id = %s
+            """
+            with span("db.confirm_diagnosis"):
+                self.cursor.execute(query, (diagnosis, diagnosis, prediction_id, user_id))
+                self.conn.commit()
+            if not self.cursor.rowcount:
+                return False, "Prediction not found"
+            self.note_write(f"user:{user_id}")
+            logger.info("Diagnosis confirmed", extra={
+                'user_id': user_id, 'prediction_id': prediction_id, 'diagnosis': diagnosis
+            })
+            return True, "Outcome saved"
+        except Error as e:
+            logger.error("Error confirming diagnosis", extra={'prediction_id': prediction_id, 'error': str(e)})
+            return False, f"Error saving outcome: {str(e)}"
+
+    def get_confirmed_since(self, confirmed_at=None, last_id=0, limit=None):
+        """
+        Confirmed predictions after the (confirmed_at, id) watermark, oldest first,
+        as (id, input_data, confirmed_diagnosis, confirmed_at) rows.
+
+        confirmed_at has one-second resolution, so rows from the current second
+        are left for the next call: a row confirmed later in that second could
+        have a lower id than the watermark and would otherwise be skipped.
+        """
+        try:
+            self.ensure_connection()
+            query = """
+                SELECT id, input_data, confirmed_diagnosis, confirmed_at
+                FROM prediction_history
+                WHERE confirmed_diagnosis IS NOT NULL
+                  AND confirmed_at < NOW() - INTERVAL 1 SECOND
+                  AND (%s IS NULL OR confirmed_at > %s OR (confirmed_at = %s AND id > %s))
+                ORDER BY confirmed_at, id
+            """
+            params = (confirmed_at, confirmed_at, confirmed_at, last_id)
+            if limit:
+                query += " LIMIT %s"
+                params += (limit,)
+            with span("db.get_confirmed_since"):
+                self.cursor.execute(query, params)
+                return self.cursor.fetchall()
+        except Error as e:
+            logger.error("Error retrieving confirmed predictions", extra={'error': str(e)})
+            return []
+
+    def ensure_rescore_columns(self):
+        """Add the columns that hold a newer model's score next to the original one"""
+        self.ensure_connection()
+        self.cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = 'prediction_history'
+              AND column_name = 'rescored_prediction'
+        """)
+        if self.cursor.fetchone()[0]:
+            return
+        self.cursor.execute("""
+            ALTER TABLE prediction_history
+                ADD COLUMN rescored_prediction VARCHAR(10) NULL,
+                ADD COLUMN rescored_malicious FLOAT NULL,
+                ADD COLUMN rescored_model VARCHAR(64) NULL,
+                ADD COLUMN rescored_at DATETIME NULL
+        """)
+        self.conn.commit()
+        logger.info("Added rescore columns to prediction_history")
+
+    def get_predictions_after(self, last_id, limit):
+        """
+        The next `limit` saved predictions after `last_id`, in id order, as
+        (id, user_id, prediction, confidence_malicious, input_data, confirmed_diagnosis) rows
+        """
+        self.ensure_connection()
+        query = """
+            SELECT id, user_id, prediction, confidence_malicious, input_data, confirmed_diagnosis
+            FROM prediction_history
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+        """
+        with span("db.get_predictions_after"):
+            self.cursor.execute(query, (last_id, limit))
+            return self.cursor.fetchall()
+
+    def save_rescores(self, rows, model):
+        """
+        Store (id, prediction, confidence_malicious) from another model for many
+        predictions at once: one multi-row insert into a temporary table, then
+        a single joined UPDATE
+        """
+        self.ensure_connection()
+        with span("db.save_rescores"):
+            self.cursor.execute("""
+                CREATE TEMPORARY TABLE IF NOT EXISTS rescore_batch (
+                    id BIGINT PRIMARY KEY,
+                    prediction VARCHAR(10),
+                    confidence_malicious FLOAT
+                )
+            """)
+            self.cursor.execute("DELETE FROM rescore_batch")
+            self.cursor.executemany(
+                "INSERT INTO rescore_batch (id, prediction, confidence_malicious) VALUES (%s, %s, %s)", rows
+            )
+            self.cursor.execute("""
+                UPDATE prediction_history p JOIN rescore_batch r ON p.id = r.id
+                SET p.rescored_prediction = r.prediction,
+                    p.rescored_malicious = r.confidence_malicious,
+                    p.rescored_model = %s,
+                    p.rescored_at = NOW()
+            """, (model,))
+            self.conn.commit()
+
     def get_user_id(self, username):
         """Get user ID from username"""
         try:
-            self.ensure_connection()
             query = "SELECT id FROM users WHERE username = %s"
-            self.cursor.execute(query, (username,))
-            result = self.cursor.fetchone()
+            result = self._read("db.get_user_id", query, (username,), [f"username:{username}"], one=True)
             return result[0] if result else None
         except Error as e:
-            print(f"Error getting user ID: {str(e)}")
+            logger.error("Error getting user ID", extra={'username': username, 'error': str(e)})
             return None
 
+    def close(self):
+        """Give this instance's connections back to the pool"""
+        for replica, conn in getattr(self, 'replica_conns', {}).items():
+            pool.put(replica, conn)
+        self.replica_conns = {}
+        if getattr(self, 'conn', None):
+            try:
+                if self.cursor:
+                    self.cursor.close()
+            except Error:
+                pass
+            pool.put(router.primary, self.conn)
+        self.conn = self.cursor = None
+
     def __del__(self):
-        if hasattr(self, 'conn') and self.conn.is_connected():
-            self.cursor.close()
-            self.conn.close() 
\ No newline at end of file
+        self.close() 
\ No newline at end of file
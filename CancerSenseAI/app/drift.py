@@ -0,0 +1,150 @@
+"""
+Streaming input-drift monitor.
+
+Every prediction input updates, in constant time and memory:
+
+  * Welford running means and variances per feature (since the monitor started),
+  * fixed-bin histograms per feature, with bins at the training deciles, kept
+    as a ring of `n_windows` windows of `window_size` inputs each.
+
+The sliding window (the sum of the ring) is compared with the training
+distribution over the same bins, using the population stability index (PSI)
+and a binned Kolmogorov-Smirnov distance. All of the state is a handful of
+small arrays and is saved periodically to one .npz file.
+
+PSI on a handful of inputs is mostly noise (a single input puts all of each
+feature's mass in one bin), so no feature is flagged until the window holds
+at least `min_window` inputs.
+"""
+import os
+import threading
+
+import numpy as np
+
+
+PSI_WARN = 0.1
+PSI_ALERT = 0.25
+EPS = 1e-4
+
+
+class DriftMonitor:
+    def __init__(self, reference, feature_names, n_bins=10, window_size=200, n_windows=5,
+                 path=None, save_every=50, min_window=100):
+        reference = np.asarray(reference, dtype=float)
+        n_features = reference.shape[1]
+        self.feature_names = list(feature_names)
+        self.window_size = window_size
+        self.min_window = min_window
+        self.path = path
+        self.save_every = save_every
+        self.lock = threading.Lock()
+
+        # Interior bin edges at the training quantiles; bins are (-inf, e1], (e1, e2], ..., (e_k, inf)
+        quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+        self.edges = np.quantile(reference, quantiles, axis=0).T
+        self.reference_hist = self._normalize(self._histogram(reference))
+        self.reference_mean = reference.mean(axis=0)
+        self.reference_std = reference.std(axis=0)
+
+        self.n = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.windows = np.zeros((n_windows, n_features, n_bins), dtype=np.int64)
+        self.window_counts = np.zeros(n_windows, dtype=np.int64)
+        self.current = 0
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def _bin(self, X):
+        """Bin index of every value, shape (n_rows, n_features)"""
+        return (X[:, :, None] > self.edges[None, :, :]).sum(axis=2)
+
+    def _histogram(self, X):
+        bins = self._bin(X)
+        n_features, n_bins = self.edges.shape[0], self.edges.shape[1] + 1
+        hist = np.zeros((n_features, n_bins), dtype=np.int64)
+        np.add.at(hist, (np.broadcast_to(np.arange(n_features), bins.shape), bins), 1)
+        return hist
+
+    @staticmethod
+    def _normalize(hist):
+        total = hist.sum(axis=-1, keepdims=True)
+        return hist / np.maximum(total, 1)
+
+    def update(self, x):
+        """Fold one input vector into the running statistics"""
+        x = np.asarray(x, dtype=float).ravel()
+        bins = self._bin(x[None, :])[0]
+        with self.lock:
+            self.n += 1
+            delta = x - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (x - self.mean)
+
+            if self.window_counts[self.current] >= self.window_size:
+                # Start the next window, overwriting the oldest one in the ring
+                self.current = (self.current + 1) % len(self.window_counts)
+                self.windows[self.current] = 0
+                self.window_counts[self.current] = 0
+            self.windows[self.current, np.arange(len(x)), bins] += 1
+            self.window_counts[self.current] += 1
+
+            due = self.path and self.n % self.save_every == 0
+        if due:
+            self.save(self.path)
+
+    def scores(self):
+        """
+        Per-feature drift of the sliding window against training, as a list of
+        dicts sorted by PSI, most drifted first.
+        """
+        with self.lock:
+            window_hist = self.windows.sum(axis=0)
+            n_window = int(self.window_counts.sum())
+            n, mean, variance = self.n, self.mean.copy(), self.m2 / max(self.n - 1, 1)
+
+        p = self._normalize(window_hist) + EPS
+        q = self.reference_hist + EPS
+        psi = ((p - q) * np.log(p / q)).sum(axis=1)
+        ks = np.abs(np.cumsum(p - q, axis=1)).max(axis=1)
+        shift = (mean - self.reference_mean) / np.where(self.reference_std > 0, self.reference_std, 1)
+
+        rows = []
+        for i, name in enumerate(self.feature_names):
+            if n_window < self.min_window:
+                status = 'insufficient data'
+            else:
+                status = 'drift' if psi[i] >= PSI_ALERT else 'watch' if psi[i] >= PSI_WARN else 'stable'
+            rows.append({
+                'feature': name,
+                'psi': float(psi[i]),
+                'ks': float(ks[i]),
+                'mean_shift': float(shift[i]),
+                'std_ratio': float(np.sqrt(variance[i]) / self.reference_std[i]) if self.reference_std[i] > 0 else None,
+                'status': status,
+            })
+        return sorted(rows, key=lambda r: r['psi'], reverse=True), n, n_window
+
+    def save(self, path):
+        with self.lock:
+            state = dict(
+                n=self.n, mean=self.mean, m2=self.m2, windows=self.windows,
+                window_counts=self.window_counts, current=self.current, edges=self.edges
+            )
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez_compressed(tmp_path, **state)
+            os.replace(tmp_path, path)
+
+    def load(self, path):
+        state = np.load(path)
+        # Saved against other bins (e.g. a new training set): start afresh
+        if state['edges'].shape != self.edges.shape or not np.allclose(state['edges'], self.edges):
+            return
+        if state['windows'].shape != self.windows.shape:
+            return
+        self.n = int(state['n'])
+        self.mean, self.m2 = state['mean'], state['m2']
+        self.windows, self.window_counts = state['windows'], state['window_counts']
+        self.current = int(state['current'])
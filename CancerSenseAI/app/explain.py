@@ -0,0 +1,111 @@
+import time
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+
+def get_background(scaler, X, size=100, random_state=42):
+    """
+    Draw a fixed background sample of training rows in scaled space. X is the
+    raw feature matrix (an array, or a memory-mapped one: only the sampled
+    rows are read). This is the one sampler used by the app and by every
+    training script, so the baseline doesn't depend on who wrote background.pkl.
+    """
+    rng = np.random.RandomState(random_state)
+    if len(X) > size:
+        X = X[np.sort(rng.choice(len(X), size, replace=False))]
+    return scaler.transform(np.asarray(X, dtype=np.float64))
+
+
+def is_logistic(model):
+    """Whether the model's decision function is a log-odds (logistic loss), so it can be explained exactly"""
+    if isinstance(model, LogisticRegression):
+        return True
+    # 'log' is the name before scikit-learn 1.1
+    return isinstance(model, SGDClassifier) and model.loss in ('log_loss', 'log')
+
+
+def linear_contributions(model, x_scaled, background):
+    """Closed-form contributions of a linear model, in log-odds"""
+    coef = model.coef_[0]
+    reference = background.mean(axis=0)
+    values = coef * (x_scaled - reference)
+    base_value = float(model.intercept_[0] + coef @ reference)
+    return values, base_value
+
+
+def sampling_shapley(model, x_scaled, background, time_budget=0.25, batch_permutations=16, max_permutations=512, random_state=0):
+    """
+    Permutation-sampling Shapley estimate of each feature's contribution
+    to the malignant probability.
+
+    Every batch of permutations is turned into a single matrix of partially
+    "switched on" inputs and scored with one predict_proba call. Batches are
+    drawn until the time budget runs out, but at least one batch is always
+    scored.
+    """
+    rng = np.random.RandomState(random_state)
+    n_features = x_scaled.shape[0]
+    totals = np.zeros(n_features)
+    n_done = 0
+    start = time.perf_counter()
+
+    while n_done < max_permutations:
+        # Antithetic pairs: each permutation is scored together with its reverse
+        half = batch_permutations // 2
+        perms = np.argsort(rng.rand(half, n_features), axis=1)
+        perms = np.vstack([perms, perms[:, ::-1]])
+        n_perms = len(perms)
+
+        base_rows = background[rng.randint(len(background), size=n_perms)]
+
+        # mask[p, s, f] is True once feature f has been switched to the input value
+        # at step s of permutation p (step 0 is the pure background row)
+        ranks = np.empty_like(perms)
+        ranks[np.arange(n_perms)[:, None], perms] = np.arange(n_features)
+        steps = np.arange(n_features + 1)[None, :, None]
+        mask = ranks[:, None, :] < steps
+
+        batch = np.where(mask, x_scaled[None, None, :], base_rows[:, None, :])
+        probs = model.predict_proba(batch.reshape(-1, n_features))[:, 1]
+        probs = probs.reshape(n_perms, n_features + 1)
+
+        deltas = np.diff(probs, axis=1)
+        np.add.at(totals, perms.ravel(), deltas.ravel())
+        n_done += n_perms
+
+        if time.perf_counter() - start >= time_budget:
+            break
+
+    base_value = float(model.predict_proba(background)[:, 1].mean())
+    return totals / n_done, base_value, n_done
+
+
+def explain_prediction(model, scaler, input_array, background, time_budget=0.25):
+    """
+    Return per-feature contributions for a single raw input row.
+
+    Logistic models are explained exactly in log-odds; every other model
+    (including other linear ones, such as modified-huber SGD) gets a sampled
+    Shapley estimate in malignant probability.
+    """
+    start = time.perf_counter()
+    x_scaled = scaler.transform(input_array.reshape(1, -1))[0]
+
+    if is_logistic(model):
+        values, base_value = linear_contributions(model, x_scaled, background)
+        method, unit, n_samples = 'exact', 'log-odds', 0
+    else:
+        values, base_value, n_samples = sampling_shapley(
+            model, x_scaled, background, time_budget=time_budget
+        )
+        method, unit = 'sampled', 'probability'
+
+    return {
+        'values': values,
+        'base_value': base_value,
+        'method': method,
+        'unit': unit,
+        'n_samples': n_samples,
+        'elapsed': time.perf_counter() - start,
+    }
@@ -0,0 +1,144 @@
+"""
+Background jobs for heavy work such as full-history PDF reports.
+
+Jobs run in a small thread pool, off the Streamlit script, and report their
+progress as a fraction from 0 to 1. A job's identity is a hash of its owner
+and parameters (e.g. user, date range, template, plus a fingerprint of the
+data such as the row count and newest id). Submitting the same job again
+returns the one that is queued, running or already finished, instead of
+starting a duplicate.
+
+Outputs and job metadata are written to CANCERSENSE_JOBS_DIR (default
+logs/jobs). Users can leave the page, come back later, or come back after a
+server restart and still download a finished job. Outputs older than
+`keep_days` are removed when the queue starts.
+"""
+import datetime
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from telemetry import get_logger, span
+
+logger = get_logger("jobs")
+
+JOBS_DIR = os.environ.get("CANCERSENSE_JOBS_DIR", "logs/jobs")
+
+
+class JobQueue:
+    def __init__(self, directory=JOBS_DIR, workers=2, keep_days=7):
+        self.directory = directory
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jobs")
+        self.lock = threading.Lock()
+        self.jobs = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load(keep_days)
+
+    def _load(self, keep_days):
+        cutoff = time.time() - keep_days * 86400
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            job_id = os.path.splitext(os.path.basename(path))[0]
+            if os.path.getmtime(path) < cutoff:
+                for stale in (path, self._output_path(job_id)):
+                    if os.path.exists(stale):
+                        os.remove(stale)
+                continue
+            with open(path) as f:
+                job = json.load(f)
+            if job['status'] in ('queued', 'running'):
+                # The process that ran it is gone
+                job.update(status='failed', error='Interrupted by a server restart')
+            self.jobs[job_id] = job
+
+    def _output_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.out")
+
+    def _save(self, job):
+        path = os.path.join(self.directory, f"{job['id']}.json")
+        with open(path + ".tmp", 'w') as f:
+            json.dump(job, f)
+        os.replace(path + ".tmp", path)
+
+    def submit(self, kind, owner, params, fn, filename, force=False):
+        """
+        Queue fn(progress) -> bytes unless an identical job is already queued,
+        running or finished (force=True replaces a finished or failed one).
+        Returns the job's id.
+        """
+        key = json.dumps([kind, owner, params], sort_keys=True, default=str)
+        job_id = hashlib.sha1(key.encode()).hexdigest()[:16]
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job and job['status'] in ('queued', 'running'):
+                return job_id
+            if job and job['status'] == 'done' and not force and os.path.exists(self._output_path(job_id)):
+                return job_id
+            job = self.jobs[job_id] = {
+                'id': job_id, 'kind': kind, 'owner': owner, 'params': params, 'filename': filename,
+                'status': 'queued', 'progress': 0.0, 'error': None,
+                'submitted': datetime.datetime.now().isoformat(timespec='seconds'),
+                'finished': None,
+            }
+            self._save(job)
+        self.pool.submit(self._run, job_id, fn)
+        logger.info("Job queued", extra={'job_id': job_id, 'kind': kind, 'owner': owner})
+        return job_id
+
+    def _progress(self, job_id, fraction):
+        with self.lock:
+            self.jobs[job_id]['progress'] = min(max(float(fraction), 0.0), 1.0)
+
+    def _run(self, job_id, fn):
+        with self.lock:
+            job = self.jobs[job_id]
+            job['status'] = 'running'
+            self._save(job)
+        try:
+            with span(f"job.{job['kind']}"):
+                output = fn(lambda fraction: self._progress(job_id, fraction))
+            path = self._output_path(job_id)
+            with open(path + ".tmp", 'wb') as f:
+                f.write(output)
+            os.replace(path + ".tmp", path)
+            status, error = 'done', None
+        except Exception as e:
+            logger.exception("Job failed", extra={'job_id': job_id})
+            status, error = 'failed', str(e)
+        with self.lock:
+            job.update(
+                status=status, error=error, progress=1.0 if status == 'done' else job['progress'],
+                finished=datetime.datetime.now().isoformat(timespec='seconds'),
+            )
+            self._save(job)
+
+    def for_owner(self, owner, kind=None):
+        """Copies of the owner's jobs, newest first"""
+        with self.lock:
+            jobs = [
+                dict(job) for job in self.jobs.values()
+                if job['owner'] == owner and (kind is None or job['kind'] == kind)
+            ]
+        return sorted(jobs, key=lambda job: job['submitted'], reverse=True)
+
+    def output(self, job_id, owner):
+        """
+        The finished output of one of the owner's jobs, or None. A finished job
+        whose output file is gone (cleaned up or deleted) is marked failed.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job['owner'] != owner or job['status'] != 'done':
+                return None
+        try:
+            with open(self._output_path(job_id), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            with self.lock:
+                job.update(status='failed', error='Report expired, generate it again')
+                self._save(job)
+            logger.warning("Job output missing", extra={'job_id': job_id})
+            return None
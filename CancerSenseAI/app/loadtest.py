@@ -0,0 +1,400 @@
+"""
+Load generator for the Streamlit app.
+
+Simulated clinician sessions drive app/main.py headlessly through Streamlit's
+AppTest harness. AppTest is not safe to run from several threads of one
+process (concurrent sessions come back with empty element trees), so every
+simulated user runs in its own worker process with its own AppTest. Each
+worker therefore warms its own caches, which shows in the login timings.
+MySQL is replaced by an in-memory stand-in with the same interface as
+`database.Database` and a configurable per-query latency, so the numbers
+reflect the app and not a shared database server. Every user only reads
+back their own rows, so each worker keeps its own copy.
+
+Each session logs in once, then loops until the run ends. Every loop picks
+a flow (predictor rerun, save, dashboard or history) and sleeps for an
+exponentially distributed think time between actions. With --batch-edits N
+the sessions switch the predictor to its form mode and apply N slider edits
+per submit, which is the figure to compare "CPU per slider edit" against.
+
+Any failed interaction means the figures describe the harness rather than
+the app; the report says so and the command exits with status 1. Only quote
+numbers from a run with no errors.
+
+Run from the project root:
+
+    python app/loadtest.py --users 20 --duration 60 --think-time 1.0
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from telemetry import percentile, span, tracer
+
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+PASSWORD = "Loadtest123"
+
+# Relative frequency of each flow once a session is logged in
+FLOWS = {
+    'predictor': 10,
+    'save': 2,
+    'dashboard': 1,
+    'history': 1,
+}
+
+
+class LocalDatabase:
+    """
+    In-process stand-in for `database.Database`, shared by all simulated sessions.
+
+    Rows are kept in the same tuple layout the MySQL queries return, and every
+    query sleeps for `latency` seconds to stand in for the network round trip.
+    """
+
+    lock = threading.Lock()
+    users = {}
+    history = {}
+    confirmed_at = {}
+    next_prediction_id = 1
+    latency = 0.0
+
+    def __init__(self):
+        self.last_prediction_id = None
+
+    @classmethod
+    def reset(cls, latency=0.0):
+        cls.users, cls.history, cls.confirmed_at, cls.next_prediction_id, cls.latency = {}, {}, {}, 1, latency
+
+    def _query(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def ensure_connection(self):
+        pass
+
+    def validate_email(self, email):
+        return '@' in email
+
+    def validate_password(self, password):
+        return len(password) >= 8
+
+    def register_user(self, username, email, password, hashed_password=None):
+        with span("db.register_user.insert"):
+            self._query()
+            hashed_password = hashed_password or bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            with self.lock:
+                if username in self.users:
+                    return False, "Username or email already exists"
+                self.users[username] = (len(self.users) + 1, username, email, hashed_password.decode('utf-8'))
+        return True, "Registration successful"
+
+    def login_user(self, username, password):
+        with span("db.login_user"):
+            self._query()
+            user = self.users.get(username)
+        if user and bcrypt.checkpw(password.encode('utf-8'), user[3].encode('utf-8')):
+            return True, "Login successful"
+        return False, "Invalid username or password"
+
+    def get_user_id(self, username):
+        with span("db.get_user_id"):
+            self._query()
+            user = self.users.get(username)
+        return user[0] if user else None
+
+    def get_user_history(self, user_id, since=None, until=None):
+        with span("db.get_user_history"):
+            self._query()
+            with self.lock:
+                records = [
+                    r for r in self.history.get(user_id, [])
+                    if (since is None or r[6].date() >= since) and (until is None or r[6].date() <= until)
+                ]
+            return sorted(records, key=lambda r: r[6], reverse=True)
+
+    def save_prediction(self, user_id, prediction, confidence_benign, confidence_malicious, input_data, notes):
+        with span("db.save_prediction"):
+            self._query()
+            input_data = {k: float(v) for k, v in input_data.items()}
+            with self.lock:
+                record_id = LocalDatabase.next_prediction_id
+                LocalDatabase.next_prediction_id += 1
+                self.history.setdefault(user_id, []).append((
+                    record_id, prediction, float(confidence_benign), float(confidence_malicious),
+                    json.dumps(input_data), notes, datetime.datetime.now(), None
+                ))
+        self.last_prediction_id = record_id
+        return True, "Prediction saved successfully"
+
+    def has_feedback_columns(self):
+        return True
+
+    def ensure_feedback_columns(self):
+        pass
+
+    def confirm_diagnosis(self, prediction_id, user_id, diagnosis):
+        with span("db.confirm_diagnosis"):
+            self._query()
+            with self.lock:
+                records = self.history.get(user_id, [])
+                for i, record in enumerate(records):
+                    if record[0] == prediction_id:
+                        confirmed_at = datetime.datetime.now() if diagnosis else None
+                        records[i] = record[:7] + (diagnosis,)
+                        self.confirmed_at[prediction_id] = confirmed_at
+                        return True, "Outcome saved"
+        return False, "Prediction not found"
+
+    def get_confirmed_since(self, confirmed_at=None, last_id=0, limit=None):
+        with span("db.get_confirmed_since"):
+            self._query()
+            with self.lock:
+                rows = [
+                    (record[0], record[4], record[7], self.confirmed_at[record[0]])
+                    for records in self.history.values() for record in records
+                    if record[7] is not None
+                ]
+        settled = datetime.datetime.now() - datetime.timedelta(seconds=1)
+        rows = sorted(
+            (
+                row for row in rows
+                if row[3] < settled and (confirmed_at is None or (row[3], row[0]) > (confirmed_at, last_id))
+            ),
+            key=lambda row: (row[3], row[0])
+        )
+        return rows[:limit] if limit else rows
+
+
+def install_local_database(latency):
+    """Make `from database import Database` inside the app resolve to the stand-in"""
+    LocalDatabase.reset(latency)
+    module = types.ModuleType("database")
+    module.Database = LocalDatabase
+    sys.modules["database"] = module
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.cpu = 0.0
+        self.stages = {}
+
+    def record(self, flow, duration, error=None):
+        self.latencies.setdefault(flow, []).append(duration)
+        self.errors.setdefault(flow, [])
+        if error:
+            self.errors[flow].append(error)
+
+    def merge(self, other):
+        """Fold in the results of one worker process"""
+        for flow, values in other.latencies.items():
+            self.latencies.setdefault(flow, []).extend(values)
+            self.errors.setdefault(flow, []).extend(other.errors[flow])
+        self.cpu += other.cpu
+        for stage, (durations, count, total) in other.stages.items():
+            merged = self.stages.setdefault(stage, [[], 0, 0.0])
+            merged[0].extend(durations)
+            merged[1] += count
+            merged[2] += total
+
+
+def find_button(at, label):
+    for button in at.button:
+        if button.label == label:
+            return button
+    raise LookupError(f"No button labelled {label!r}")
+
+
+class Session:
+    """One simulated clinician driving a private AppTest instance"""
+
+    def __init__(self, username, results, think_time, rng, timeout, batch_edits=0):
+        from streamlit.testing.v1 import AppTest
+
+        self.username = username
+        self.batch_edits = batch_edits
+        self.results = results
+        self.think_time = think_time
+        self.rng = rng
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def timed(self, flow, action):
+        start = time.perf_counter()
+        error = None
+        try:
+            action()
+            if self.at.exception:
+                error = self.at.exception[0].message
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.results.record(flow, time.perf_counter() - start, error)
+        return error is None
+
+    def login(self):
+        def action():
+            self.at.run()
+            self.at.text_input(key="login_username").input(self.username)
+            self.at.text_input(key="login_password").input(PASSWORD)
+            self.at.button(key="login_button").click().run()
+            if not self.at.session_state["logged_in"]:
+                raise RuntimeError("login failed")
+            if self.batch_edits:
+                self.at.toggle(key="batch_inputs").set_value(True).run()
+        return self.timed('login', action)
+
+    def open_view(self, label):
+        find_button(self.at, label).click().run()
+
+    def predictor(self):
+        if self.at.session_state["current_view"] != 'predictor':
+            self.open_view("Predictor")
+        if self.batch_edits:
+            sliders = [s for s in self.at.slider if s.key.startswith("form_")]
+            for slider in self.rng.sample(sliders, self.batch_edits):
+                slider.set_value(self.rng.uniform(slider.min, slider.max))
+            find_button(self.at, "Apply").click().run()
+        else:
+            slider = self.rng.choice(list(self.at.slider))
+            slider.set_value(self.rng.uniform(slider.min, slider.max)).run()
+
+    def save(self):
+        if self.at.session_state["current_view"] != 'predictor':
+            self.open_view("Predictor")
+        self.at.text_area[0].input(f"load test note {self.rng.random():.6f}")
+        find_button(self.at, "Save Prediction").click().run()
+
+    def run(self, deadline):
+        if not self.login():
+            return
+        flows, weights = zip(*FLOWS.items())
+        actions = {
+            'predictor': self.predictor,
+            'save': self.save,
+            'dashboard': lambda: self.open_view("Dashboard"),
+            'history': lambda: self.open_view("History"),
+        }
+        while time.time() < deadline:
+            time.sleep(self.rng.expovariate(1 / self.think_time) if self.think_time else 0)
+            flow = self.rng.choices(flows, weights)[0]
+            self.timed(flow, actions[flow])
+
+
+def simulate(i, username, hashed_password, start_at, deadline, think_time, db_latency, timeout, seed, batch_edits, run_dir):
+    """One simulated user, run in its own worker process; returns its Results"""
+    install_local_database(db_latency)
+    # Keep cases saved and shadow scores logged during the run out of the real files
+    os.environ["CANCERSENSE_CASE_INDEX"] = os.path.join(run_dir, f"case_index-{i}.pkl")
+    os.environ["CANCERSENSE_SHADOW_LOG"] = os.path.join(run_dir, f"shadow-{i}.jsonl")
+    os.environ["CANCERSENSE_DRIFT_STATE"] = os.path.join(run_dir, f"drift-{i}.npz")
+    LocalDatabase().register_user(username, f"{username}@example.com", PASSWORD, hashed_password)
+
+    results = Results()
+    time.sleep(max(start_at - time.time(), 0))
+    cpu_start = time.process_time()
+    Session(username, results, think_time, random.Random(seed + i), timeout, batch_edits).run(deadline)
+    results.cpu = time.process_time() - cpu_start
+    with tracer.lock:
+        results.stages = {
+            stage: (list(values), tracer.counts[stage], tracer.totals[stage])
+            for stage, values in tracer.durations.items()
+        }
+    return results
+
+
+def run_load_test(users, duration, think_time, db_latency, ramp_up, timeout, seed, batch_edits=0):
+    run_dir = tempfile.mkdtemp(prefix="loadtest-")
+    # One hash reused for every account: logins still pay the full bcrypt check
+    hashed_password = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt())
+
+    results = Results()
+    start = time.time()
+    deadline = start + duration
+    # spawn, not fork: a fresh interpreter per user, with no state copied from this one
+    with ProcessPoolExecutor(max_workers=users, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(
+                simulate, i, f"loadtest{i:04d}", hashed_password, start + ramp_up * i / max(users, 1), deadline,
+                think_time, db_latency, timeout, seed, batch_edits, run_dir
+            )
+            for i in range(users)
+        ]
+        for future in futures:
+            results.merge(future.result())
+
+    elapsed = time.time() - start
+    return results, elapsed, results.cpu
+
+
+def print_report(results, elapsed, cpu, users, batch_edits=0):
+    total = sum(len(v) for v in results.latencies.values())
+    slider_edits = len(results.latencies.get('predictor', [])) * max(batch_edits, 1)
+    total_errors = sum(len(v) for v in results.errors.values())
+
+    print("\n" + "="*78)
+    print(f"LOAD TEST: {users} sessions, {elapsed:.1f} s, {total} interactions")
+    print("="*78)
+    print(f"{'flow':<12}{'count':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>9}")
+    for flow, values in sorted(results.latencies.items()):
+        values = sorted(values)
+        errors = results.errors[flow]
+        print(
+            f"{flow:<12}{len(values):>8}{len(values) / elapsed:>9.2f}"
+            f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+            f"{percentile(values, 99) * 1000:>10.1f}{values[-1] * 1000:>10.1f}"
+            f"{len(errors) / len(values):>8.1%}"
+        )
+    print("-"*78)
+    print(f"Throughput: {total / elapsed:.2f} interactions/s, error rate {total_errors / max(total, 1):.2%}")
+    print(f"Server CPU: {cpu:.1f} s total, {cpu / max(total, 1) * 1000:.1f} ms per interaction, "
+          f"{slider_edits} slider edits")
+
+    print("\nSlowest stages (server side)")
+    print("-"*78)
+    stages = sorted(results.stages.items(), key=lambda item: item[1][2], reverse=True)
+    for stage, (durations, count, _) in stages[:10]:
+        durations = sorted(durations)
+        print(f"{stage:<28}{count:>8}" + "".join(f"{percentile(durations, q) * 1000:>10.1f}" for q in (50, 95, 99)))
+
+    for flow, errors in sorted(results.errors.items()):
+        if errors:
+            print(f"\nFirst {flow} error: {errors[0]}")
+    if total_errors:
+        print(f"\n{total_errors} interactions failed. These figures are not valid until a run has no errors.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent clinician sessions against the app")
+    parser.add_argument("--users", type=int, default=10, help="concurrent sessions")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to keep the sessions running")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between actions, in seconds")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which sessions are started")
+    parser.add_argument("--db-latency", type=float, default=2, help="simulated latency per database query, in ms")
+    parser.add_argument("--timeout", type=float, default=60, help="per-rerun timeout, in seconds")
+    parser.add_argument("--batch-edits", type=int, default=0, help="slider edits per Apply in form mode (0: live sliders)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    results, elapsed, cpu = run_load_test(
+        args.users, args.duration, args.think_time, args.db_latency / 1000, args.ramp_up, args.timeout, args.seed,
+        args.batch_edits
+    )
+    print_report(results, elapsed, cpu, args.users, args.batch_edits)
+    if any(results.errors.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
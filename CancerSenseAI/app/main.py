@@ -1,77 +1,121 @@
 import streamlit as st
 import pickle
-import pandas as pd
-import plotly.graph_objects as go
-import numpy as np
-from database import Database
 import datetime
-from PIL import Image
+import hashlib
 import json
-from fpdf import FPDF
-import plotly.express as px
+import os
+import sys
+import time
+from telemetry import span, tracer
 
+# Modules shared with the training script live next to the model artifacts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
 
+# Heavy dependencies (pandas, numpy, plotly, scikit-learn, FPDF and the MySQL
+# connector behind `database`) are imported inside the views that use them, so
+# the login page starts without them and each view only pays for its own
+# imports the first time it is opened. Python keeps them loaded afterwards.
+
+
+@st.cache_resource
+def load_css():
+    with open("assets/style.css") as f:
+        return "<style>{}</style>".format(f.read())
+
+
+@st.cache_resource
 def get_clean_data():
-  data = pd.read_csv("data/data.csv")
+  # Read-only view of the compiled dataset cache (model/dataset.py), memory-mapped
+  # so every app process shares one copy; callers must not modify it in place
+  from dataset import load_clean_data
   
-  data = data.drop(['Unnamed: 32', 'id'], axis=1)
-  
-  data['diagnosis'] = data['diagnosis'].map({ 'M': 1, 'B': 0 })
+  with span("csv.load"):
+    data = load_clean_data("data/data.csv")
   
   return data
 
 
-def add_sidebar():
-  st.sidebar.markdown('<h3 style="color: #1e3d7b;">Cell Nuclei Measurements</h3>', unsafe_allow_html=True)
-  
+SLIDER_LABELS = [
+    ("Radius (mean)", "radius_mean"),
+    ("Texture (mean)", "texture_mean"),
+    ("Perimeter (mean)", "perimeter_mean"),
+    ("Area (mean)", "area_mean"),
+    ("Smoothness (mean)", "smoothness_mean"),
+    ("Compactness (mean)", "compactness_mean"),
+    ("Concavity (mean)", "concavity_mean"),
+    ("Concave points (mean)", "concave points_mean"),
+    ("Symmetry (mean)", "symmetry_mean"),
+    ("Fractal dimension (mean)", "fractal_dimension_mean"),
+    ("Radius (se)", "radius_se"),
+    ("Texture (se)", "texture_se"),
+    ("Perimeter (se)", "perimeter_se"),
+    ("Area (se)", "area_se"),
+    ("Smoothness (se)", "smoothness_se"),
+    ("Compactness (se)", "compactness_se"),
+    ("Concavity (se)", "concavity_se"),
+    ("Concave points (se)", "concave points_se"),
+    ("Symmetry (se)", "symmetry_se"),
+    ("Fractal dimension (se)", "fractal_dimension_se"),
+    ("Radius (worst)", "radius_worst"),
+    ("Texture (worst)", "texture_worst"),
+    ("Perimeter (worst)", "perimeter_worst"),
+    ("Area (worst)", "area_worst"),
+    ("Smoothness (worst)", "smoothness_worst"),
+    ("Compactness (worst)", "compactness_worst"),
+    ("Concavity (worst)", "concavity_worst"),
+    ("Concave points (worst)", "concave points_worst"),
+    ("Symmetry (worst)", "symmetry_worst"),
+    ("Fractal dimension (worst)", "fractal_dimension_worst"),
+]
+
+
+def init_measurements():
+  # The last applied measurements, shared by the slider panel, the charts and the save form
+  if 'measurements' not in st.session_state:
+    data = get_clean_data()
+    st.session_state.measurements = {key: float(data[key].mean()) for _, key in SLIDER_LABELS}
+
+
+def add_sliders(key_prefix):
   data = get_clean_data()
   
-  slider_labels = [
-        ("Radius (mean)", "radius_mean"),
-        ("Texture (mean)", "texture_mean"),
-        ("Perimeter (mean)", "perimeter_mean"),
-        ("Area (mean)", "area_mean"),
-        ("Smoothness (mean)", "smoothness_mean"),
-        ("Compactness (mean)", "compactness_mean"),
-        ("Concavity (mean)", "concavity_mean"),
-        ("Concave points (mean)", "concave points_mean"),
-        ("Symmetry (mean)", "symmetry_mean"),
-        ("Fractal dimension (mean)", "fractal_dimension_mean"),
-        ("Radius (se)", "radius_se"),
-        ("Texture (se)", "texture_se"),
-        ("Perimeter (se)", "perimeter_se"),
-        ("Area (se)", "area_se"),
-        ("Smoothness (se)", "smoothness_se"),
-        ("Compactness (se)", "compactness_se"),
-        ("Concavity (se)", "concavity_se"),
-        ("Concave points (se)", "concave points_se"),
-        ("Symmetry (se)", "symmetry_se"),
-        ("Fractal dimension (se)", "fractal_dimension_se"),
-        ("Radius (worst)", "radius_worst"),
-        ("Texture (worst)", "texture_worst"),
-        ("Perimeter (worst)", "perimeter_worst"),
-        ("Area (worst)", "area_worst"),
-        ("Smoothness (worst)", "smoothness_worst"),
-        ("Compactness (worst)", "compactness_worst"),
-        ("Concavity (worst)", "concavity_worst"),
-        ("Concave points (worst)", "concave points_worst"),
-        ("Symmetry (worst)", "symmetry_worst"),
-        ("Fractal dimension (worst)", "fractal_dimension_worst"),
-    ]
-
   input_dict = {}
 
-  for label, key in slider_labels:
-    input_dict[key] = st.sidebar.slider(
+  for label, key in SLIDER_LABELS:
+    # Seed the widget from the applied measurements the first time it is drawn,
+    # passing no `value` keeps the widget identity stable across reruns
+    widget_key = f"{key_prefix}_{key}"
+    if widget_key not in st.session_state:
+      st.session_state[widget_key] = st.session_state.measurements[key]
+    input_dict[key] = st.slider(
       label,
       min_value=float(0),
       max_value=float(data[key].max()),
-      value=float(data[key].mean())
+      key=widget_key
     )
     
   return input_dict
 
 
+def reseed_sliders():
+  # On a mode switch, start the newly shown sliders from the applied measurements
+  # instead of the values they were left at the last time that mode was used
+  prefix = 'form' if st.session_state.batch_inputs else 'live'
+  for _, key in SLIDER_LABELS:
+    st.session_state[f"{prefix}_{key}"] = st.session_state.measurements[key]
+
+
+def add_sidebar():
+  # Batch mode: slider edits are collected by the form and applied in one rerun
+  with st.sidebar.form("measurements_form"):
+    st.markdown('<h3 style="color: #1e3d7b;">Cell Nuclei Measurements</h3>', unsafe_allow_html=True)
+    input_dict = add_sliders('form')
+    if st.form_submit_button("Apply", use_container_width=True):
+      st.session_state.measurements = input_dict
+    
+  return st.session_state.measurements
+
+
 def get_scaled_values(input_dict):
   data = get_clean_data()
   
@@ -89,6 +133,7 @@ def get_scaled_values(input_dict):
   
 
 def get_radar_chart(input_data):
+  import plotly.graph_objects as go
   
   input_data = get_scaled_values(input_data)
   
@@ -144,15 +189,167 @@ def get_radar_chart(input_data):
   return fig
 
 
+def artifacts_mtime():
+    # Changes whenever model/main.py, train_streaming.py or refresh.py rewrites the model or scaler
+    return max(os.path.getmtime("model/model.pkl"), os.path.getmtime("model/scaler.pkl"))
+
+
+@st.cache_resource(max_entries=2)
+def load_artifacts(mtime):
+    with span("model.load"):
+        model = pickle.load(open("model/model.pkl", "rb"))
+        scaler = pickle.load(open("model/scaler.pkl", "rb"))
+    return model, scaler
+
+
+def load_model():
+    # Keyed on the files' mtime so a retrained or refreshed model is picked up
+    return load_artifacts(artifacts_mtime())
+
+
+# The scaler itself isn't hashed (leading underscore), so the caches built from
+# it are keyed on the mtime its load_artifacts entry was loaded under
+@st.cache_resource(max_entries=2)
+def load_background(_scaler, mtime):
+    """Background sample saved with the model, or drawn from the training data if missing"""
+    from explain import get_background
+
+    if os.path.exists("model/background.pkl"):
+        return pickle.load(open("model/background.pkl", "rb"))
+    return get_background(_scaler, get_clean_data().drop(['diagnosis'], axis=1).values)
+
+
+def get_explanation_chart(input_data, top_n=10):
+    import numpy as np
+    import plotly.graph_objects as go
+    from explain import explain_prediction
+
+    mtime = artifacts_mtime()
+    model, scaler = load_artifacts(mtime)
+    background = load_background(scaler, mtime)
+
+    input_array = np.array(list(input_data.values()))
+    with span("explain"):
+        explanation = explain_prediction(model, scaler, input_array, background)
+
+    # Keep the features with the largest effect, smallest at the bottom of the chart
+    keys = list(input_data.keys())
+    order = np.argsort(np.abs(explanation['values']))[-top_n:]
+    values = explanation['values'][order]
+    labels = [keys[i].replace('_', ' ') for i in order]
+    colors = ['#ff4b4b' if v > 0 else '#00cc00' for v in values]
+
+    with span("chart.explanation"):
+        fig = go.Figure(go.Bar(
+            x=values,
+            y=labels,
+            orientation='h',
+            marker_color=colors
+        ))
+
+        fig.update_layout(
+            title=f"Feature contributions ({explanation['unit']})",
+            xaxis_title="Towards benign  ←  →  Towards malignant",
+            showlegend=False
+        )
+
+    return fig, explanation
+
+
+@st.cache_resource(max_entries=2)
+def get_case_base(_scaler, mtime):
+    """Similar-case index shared by all sessions, rebuilt if missing or trained with another scaler"""
+    from case_index import CaseBase
+
+    path = os.environ.get("CANCERSENSE_CASE_INDEX", "model/case_index.pkl")
+    case_base = CaseBase.load(_scaler, path)
+    if case_base is None:
+        data = get_clean_data()
+        case_base = CaseBase(_scaler, path)
+        case_base.build(data.drop(['diagnosis'], axis=1).values, data['diagnosis'].values)
+        case_base.save()
+        case_base.replay_log()
+    return case_base
+
+
+def current_case_base():
+    mtime = artifacts_mtime()
+    _, scaler = load_artifacts(mtime)
+    return get_case_base(scaler, mtime)
+
+
+@st.cache_resource
+def get_shadow():
+    """Challenger models scored in the background on the same inputs as the live model"""
+    from shadow import ShadowEvaluator, load_challengers
+
+    return ShadowEvaluator(load_challengers())
+
+
+def load_saved_cases(case_base, user_id, keys):
+    """Index the user's saved predictions from the database, once per process"""
+    import numpy as np
+    from database import Database
+
+    X, labels, ids, confirmed = [], [], [], []
+    with span("case_index.load_user"):
+        for record in Database().get_user_history(user_id):
+            id, prediction, _, _, input_data_str, _, _, confirmed_diagnosis = record
+            try:
+                values = json.loads(input_data_str)
+                X.append([values[key] for key in keys])
+            except (KeyError, TypeError, ValueError):
+                continue
+            labels.append(1 if (confirmed_diagnosis or prediction) == 'Malignant' else 0)
+            ids.append(id)
+            confirmed.append(confirmed_diagnosis is not None)
+        case_base.load_user(user_id, np.array(X).reshape(-1, len(keys)), labels, ids, confirmed)
+
+
+def show_similar_cases(input_data, k=5):
+    import numpy as np
+    import pandas as pd
+
+    case_base = current_case_base()
+    if case_base.needs_user(st.session_state.user_id):
+        load_saved_cases(case_base, st.session_state.user_id, list(input_data.keys()))
+    cases = case_base.query(np.array(list(input_data.values())), user_id=st.session_state.user_id, k=k)
+
+    st.markdown('<h3 style="color: #1e3c72;">Similar Cases</h3>', unsafe_allow_html=True)
+    st.dataframe(
+        pd.DataFrame([{
+            'Case': f"Training #{c['id']}" if c['source'] == 'training' else f"Saved #{c['id']}",
+            'Diagnosis': c['diagnosis'],
+            'Basis': 'Training label' if c['source'] == 'training' else 'Confirmed' if c['confirmed'] else 'Model prediction',
+            'Distance': round(c['distance'], 3)
+        } for c in cases]),
+        hide_index=True,
+        use_container_width=True
+    )
+
+
 def add_predictions(input_data):
-    model = pickle.load(open("model/model.pkl", "rb"))
-    scaler = pickle.load(open("model/scaler.pkl", "rb"))
-    
+    import numpy as np
+
+    model, scaler = load_model()
+
     input_array = np.array(list(input_data.values())).reshape(1, -1)
-    input_array_scaled = scaler.transform(input_array)
-    prediction = model.predict(input_array_scaled)
-    prob_benign = model.predict_proba(input_array_scaled)[0][0]
-    prob_malicious = model.predict_proba(input_array_scaled)[0][1]
+    with span("scale"):
+        input_array_scaled = scaler.transform(input_array)
+    start = time.perf_counter()
+    with span("predict"):
+        prediction = model.predict(input_array_scaled)
+        prob_benign, prob_malicious = model.predict_proba(input_array_scaled)[0]
+    latency = time.perf_counter() - start
+    # The fragment reruns for other widgets, Apply with no edits and every return to
+    # this view; record each distinct input once so reruns don't skew the statistics
+    input_hash = hashlib.sha1(input_array.tobytes()).hexdigest()
+    new_input = st.session_state.get('recorded_input') != input_hash
+    st.session_state.recorded_input = input_hash
+    if new_input:
+        get_shadow().submit(input_array, input_array_scaled, prediction[0], prob_malicious, latency)
+        with span("drift.update"):
+            get_drift_monitor().update(input_array[0])
     prediction_type = "Benign" if prediction[0] == 0 else "Malignant"
     
     # Using HTML/CSS for consistent styling with dark text
@@ -175,19 +372,88 @@ def add_predictions(input_data):
         </div>
     """, unsafe_allow_html=True)
 
-    # Add notes field and save button
+    show_similar_cases(input_data)
+
+    # Picked up by the save form, which reruns on its own
+    st.session_state.last_prediction = {
+        'input_data': dict(input_data),
+        'prediction': int(prediction[0]),
+        'prediction_type': prediction_type,
+        'prob_benign': prob_benign,
+        'prob_malicious': prob_malicious,
+    }
+
+
+def add_sensitivity(input_data, n_points=100, default_features=4):
+    """What-if curves: malignancy probability as each measurement moves across its slider range"""
+    import numpy as np
+    import plotly.graph_objects as go
+    from sensitivity import sensitivity_sweep
+
+    model, scaler = load_model()
+    data = get_clean_data()
+    keys = list(input_data.keys())
+
+    with span("sensitivity"):
+        grid, probs = sensitivity_sweep(
+            model, scaler, np.array(list(input_data.values())),
+            lows=np.zeros(len(keys)), highs=data[keys].max().values, n_points=n_points
+        )
+
+    with st.expander("What-if sensitivity"):
+        # Start from the measurements that can swing the first prediction the most. Seeded
+        # once: a default that follows the inputs would make Streamlit reset the selection
+        if "sensitivity_features" not in st.session_state:
+            swing = probs.max(axis=1) - probs.min(axis=1)
+            st.session_state["sensitivity_features"] = [keys[i] for i in np.argsort(swing)[::-1][:default_features]]
+        selected = st.multiselect("Measurements", keys, key="sensitivity_features")
+
+        with span("chart.sensitivity"):
+            fig = go.Figure()
+            for key in selected:
+                i = keys.index(key)
+                # x is the fraction of the slider range so every curve shares one axis
+                fig.add_trace(go.Scatter(
+                    x=grid[i] / grid[i][-1], y=probs[i], mode='lines', name=key.replace('_', ' '),
+                    customdata=grid[i], hovertemplate='%{customdata:.4f}: %{y:.3f}'
+                ))
+                fig.add_trace(go.Scatter(
+                    x=[input_data[key] / grid[i][-1]], y=[np.interp(input_data[key], grid[i], probs[i])],
+                    mode='markers', marker=dict(size=9, color='black'), showlegend=False, hoverinfo='skip'
+                ))
+
+            fig.update_layout(
+                xaxis_title="Position in measurement range",
+                yaxis_title="Probability of malignancy",
+                yaxis=dict(range=[0, 1]),
+                xaxis=dict(tickformat='.0%')
+            )
+        st.plotly_chart(fig, use_container_width=True)
+
+
+@st.fragment
+def add_save_form():
+    """Notes and save button; typing notes or saving only reruns this fragment"""
+    import numpy as np
+    from database import Database
+
     notes = st.text_area("Add notes (optional)")
     if st.button("Save Prediction"):
+        last = st.session_state.last_prediction
         db = Database()
         success, message = db.save_prediction(
             user_id=st.session_state.user_id,
-            prediction=prediction_type,
-            confidence_benign=prob_benign,
-            confidence_malicious=prob_malicious,
-            input_data=input_data,
+            prediction=last['prediction_type'],
+            confidence_benign=last['prob_benign'],
+            confidence_malicious=last['prob_malicious'],
+            input_data=last['input_data'],
             notes=notes
         )
         if success:
+            current_case_base().add_case(
+                st.session_state.user_id, db.last_prediction_id,
+                np.array(list(last['input_data'].values())), last['prediction']
+            )
             st.success("Prediction saved successfully!")
         else:
             st.error(f"Failed to save prediction: {message}")
@@ -199,6 +465,35 @@ def add_predictions(input_data):
     """, unsafe_allow_html=True)
 
 
+@st.fragment
+def show_predictor(batch_mode):
+    """
+    Measurements, charts and prediction. In live mode the sliders live inside
+    this fragment, so moving one reruns only this part of the page.
+    """
+    if batch_mode:
+        input_data = st.session_state.measurements
+        col1, col2 = st.columns(2)
+    else:
+        col0, col1, col2 = st.columns([1, 2, 2])
+        with col0:
+            st.markdown('<h3 style="color: #1e3d7b;">Cell Nuclei Measurements</h3>', unsafe_allow_html=True)
+            input_data = add_sliders('live')
+        st.session_state.measurements = input_data
+
+    with col1:
+        with span("chart.radar"):
+            radar_chart = get_radar_chart(input_data)
+        st.plotly_chart(radar_chart, use_container_width=True)
+    with col2:
+        explanation_chart, explanation = get_explanation_chart(input_data)
+        st.plotly_chart(explanation_chart, use_container_width=True)
+        if explanation['method'] == 'sampled':
+            st.caption(f"Estimated from {explanation['n_samples']} sampled permutations in {explanation['elapsed']*1000:.0f} ms")
+    add_predictions(input_data)
+    add_sensitivity(input_data)
+
+
 def init_session_state():
     """Initialize session state variables"""
     if 'logged_in' not in st.session_state:
@@ -213,6 +508,8 @@ def init_session_state():
         st.session_state.current_view = 'predictor'  # Default view
 
 def login_form():
+    from database import Database
+
     col1, col2, col3 = st.columns([1, 2, 1])
     
     with col2:
@@ -266,6 +563,8 @@ def login_form():
         st.markdown('</div>', unsafe_allow_html=True)
 
 def signup_form():
+    from database import Database
+
     col1, col2, col3 = st.columns([1, 2, 1])
     
     with col2:
@@ -339,22 +638,105 @@ def show_navigation():
     if 'current_view' not in st.session_state:
         st.session_state.current_view = 'predictor'
     
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        if st.button("Predictor", use_container_width=True):
-            st.session_state.current_view = 'predictor'
-            st.rerun()
-    with col2:
-        if st.button("Dashboard", use_container_width=True):
-            st.session_state.current_view = 'dashboard'
-            st.rerun()
-    with col3:
-        if st.button("History", use_container_width=True):
-            st.session_state.current_view = 'history'
-            st.rerun()
+    views = [("Predictor", 'predictor'), ("Dashboard", 'dashboard'), ("History", 'history')]
+    if is_admin():
+        views.append(("Metrics", 'metrics'))
+    
+    for col, (label, view) in zip(st.columns(len(views)), views):
+        with col:
+            if st.button(label, use_container_width=True):
+                st.session_state.current_view = view
+                st.rerun()
+
+def is_admin():
+    """Admins are listed by username in CANCERSENSE_ADMINS (comma separated)"""
+    admins = [name.strip() for name in os.environ.get("CANCERSENSE_ADMINS", "").split(",") if name.strip()]
+    return st.session_state.get('logged_in') and st.session_state.get('username') in admins
+
+def show_metrics():
+    import pandas as pd
+    from replicas import router
+
+    st.markdown("""
+        <div class="dashboard-container">
+            <h2>Performance Metrics</h2>
+            <p class="subtitle">Time spent in each stage by this server process (last 1000 calls per stage)</p>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    summary = tracer.summary()
+    if not summary:
+        st.info("No timings recorded yet.")
+        return
+    
+    st.dataframe(
+        pd.DataFrame([{
+            'Stage': stage,
+            'Calls': stats['count'],
+            'Errors': stats['errors'],
+            'p50 (ms)': round(stats['p50'] * 1000, 2),
+            'p95 (ms)': round(stats['p95'] * 1000, 2),
+            'p99 (ms)': round(stats['p99'] * 1000, 2),
+            'Total (s)': round(stats['total'], 2),
+        } for stage, stats in summary.items()]),
+        hide_index=True,
+        use_container_width=True
+    )
+    
+    rows, pending, dropped = get_shadow().report()
+    if len(rows) > 1:
+        st.markdown("### Shadow Models")
+        st.caption(f"Challengers scored off the request path since this process started. {pending} queued, {dropped} dropped.")
+        st.dataframe(
+            pd.DataFrame([{
+                'Model': name,
+                'Scored': s['count'],
+                'Agreement': f"{s['agreement']:.1%}" if s['agreement'] is not None else '-',
+                'Mean |Δ p|': round(s['mean_abs_diff'], 4) if s['mean_abs_diff'] is not None else '-',
+                'p50 (ms)': round(s['p50_latency'] * 1000, 2),
+                'p95 (ms)': round(s['p95_latency'] * 1000, 2),
+            } for name, s in rows.items()]),
+            hide_index=True,
+            use_container_width=True
+        )
+    
+    replicas, counts = router.status()
+    if replicas:
+        st.markdown("### Database Replicas")
+        st.caption(
+            f"Reads served by replicas: {counts['replica']}, by the primary: {counts['primary']} "
+            f"({counts['sticky']} kept on the primary after the user's own write, "
+            f"{counts['lagging']} replica checks too far behind, {counts['failover']} failovers)."
+        )
+        st.dataframe(
+            pd.DataFrame([{
+                'Replica': name,
+                'Lag (s)': h['lag'] if h['lag'] is not None else '-',
+                'Skipped for (s)': round(h['down_for'], 1),
+                'Last error': h['error'] or '',
+            } for name, h in replicas.items()]),
+            hide_index=True,
+            use_container_width=True
+        )
+    
+    if st.button("Export Prometheus metrics"):
+        path = tracer.export_prometheus()
+        st.success(f"Metrics written to {path}")
+    st.download_button(
+        label="Download metrics",
+        data=tracer.to_prometheus(),
+        file_name="metrics.prom",
+        mime="text/plain",
+    )
+
+def generate_report(history_data, username, template='detailed', progress=None):
+    """
+    Generate a medical report from prediction history. The 'summary' template
+    leaves out the per-prediction pages; progress, if given, is called with
+    the fraction of predictions rendered so far.
+    """
+    from fpdf import FPDF
 
-def generate_report(history_data, username):
-    """Generate a detailed medical report from prediction history"""
     class PDF(FPDF):
         def header(self):
             self.set_font('Arial', 'B', 15)
@@ -405,13 +787,16 @@ def generate_report(history_data, username):
     Total Benign Predictions: {benign_count}
     Malignancy Rate: {(malignant_count/len(history_data)*100):.1f}%
     """)
+    if progress and template != 'detailed':
+        progress(0.5)
     
     # Detailed Predictions
-    pdf.add_page()
-    pdf.chapter_title('Detailed Prediction History')
+    if template == 'detailed':
+        pdf.add_page()
+        pdf.chapter_title('Detailed Prediction History')
     
-    for record in history_data:
-        id, prediction, conf_benign, conf_malicious, input_data_str, notes, timestamp = record
+    for i, record in enumerate(history_data if template == 'detailed' else []):
+        id, prediction, conf_benign, conf_malicious, input_data_str, notes, timestamp, confirmed = record
         
         # Box for each prediction
         pdf.set_draw_color(100, 100, 100)
@@ -460,6 +845,9 @@ def generate_report(history_data, username):
         # Check if we need a new page
         if pdf.get_y() > 250:
             pdf.add_page()
+        
+        if progress:
+            progress((i + 1) / len(history_data))
     
     # Disclaimer page
     pdf.add_page()
@@ -476,11 +864,16 @@ def generate_report(history_data, username):
     For medical professionals use only.
     """)
     
-    return pdf.output(dest='S').encode('latin-1')
+    output = pdf.output(dest='S').encode('latin-1')
+    if progress:
+        progress(1.0)
+    return output
 
 def generate_single_report(record, username):
     """Generate a report for a single prediction"""
-    id, prediction, conf_benign, conf_malicious, input_data_str, notes, timestamp = record
+    from fpdf import FPDF
+
+    id, prediction, conf_benign, conf_malicious, input_data_str, notes, timestamp, confirmed = record
     
     class PDF(FPDF):
         def header(self):
@@ -524,6 +917,8 @@ def generate_single_report(record, username):
     pdf.set_font('Arial', '', 10)
     pdf.cell(0, 5, f'Confidence (Benign): {conf_benign:.1%}', 0, 1, 'L')
     pdf.cell(0, 5, f'Confidence (Malignant): {conf_malicious:.1%}', 0, 1, 'L')
+    if confirmed:
+        pdf.cell(0, 5, f'Confirmed Diagnosis: {confirmed}', 0, 1, 'L')
     pdf.ln(2)
     
     # Key Measurements - Left aligned
@@ -583,7 +978,63 @@ def generate_single_report(record, username):
     
     return pdf.output(dest='S').encode('latin-1')
 
+REPORT_TEMPLATES = {
+    'detailed': "Detailed (every prediction)",
+    'summary': "Summary statistics only",
+}
+
+@st.cache_resource
+def get_report_jobs():
+    """Process-wide report queue; jobs outlive the page (and session) that submitted them"""
+    from jobs import JobQueue
+
+    return JobQueue()
+
+def build_report(user_id, username, start_date, end_date, template, include_archive, progress):
+    """Report job: load the user's predictions in the range and render the PDF, off the script thread"""
+    from database import Database
+    from partitions import read_archive
+
+    history = Database().get_user_history(user_id, since=start_date, until=end_date)
+    if include_archive:
+        history += read_archive(user_id, start_date, end_date)
+    if not history:
+        raise ValueError("No predictions in the selected date range")
+    return generate_report(history, username, template, progress)
+
+def show_report_jobs(polling):
+    """The user's recent report jobs; reruns itself every few seconds while one is in progress"""
+    queue = get_report_jobs()
+    jobs = queue.for_owner(st.session_state.user_id, kind='report')[:5]
+    active = False
+    for job in jobs:
+        params = job['params']
+        label = f"{REPORT_TEMPLATES[params['template']]}, {params['start']} to {params['end']}"
+        if job['status'] in ('queued', 'running'):
+            active = True
+            st.progress(job['progress'], text=f"{label}: {job['status']}")
+        elif job['status'] == 'done':
+            output = queue.output(job['id'], st.session_state.user_id)
+            if output is None:
+                st.warning(f"{label}: report expired, generate it again")
+                continue
+            st.download_button(
+                label=f"📥 Download report ({label})",
+                data=output,
+                file_name=job['filename'],
+                mime="application/pdf",
+                key=f"download_{job['id']}",
+            )
+        else:
+            st.error(f"{label}: {job['error']}")
+    if polling and not active:
+        # Stop polling once everything has finished
+        st.rerun()
+
 def show_history():
+    from database import Database
+    from partitions import live_cutoff, read_archive
+
     st.markdown("""
         <div class="history-container">
             <h2>Prediction History & Reports</h2>
@@ -591,9 +1042,19 @@ def show_history():
         </div>
     """, unsafe_allow_html=True)
     
-    # Get user history
+    # Get user history; recent months come from the live table, older ones from the archive on request
     db = Database()
-    all_history = db.get_user_history(st.session_state.user_id)
+    cutoff = live_cutoff()
+    all_history = db.get_user_history(st.session_state.user_id, since=cutoff)
+    archived_ids = set()
+    include_archive = bool(cutoff) and st.checkbox(
+        "Include archived predictions", help=f"Predictions from before {cutoff:%B %Y}" if cutoff else None
+    )
+    if include_archive:
+        with span("archive.read"):
+            archived = read_archive(st.session_state.user_id)
+        archived_ids = {record[0] for record in archived}
+        all_history += archived
     
     if not all_history:
         st.info("No predictions saved yet. Make some predictions to see them here!")
@@ -635,10 +1096,37 @@ def show_history():
     except Exception as e:
         st.error(f"Error processing dates: {str(e)}")
         filtered_history = all_history  # Show all if date filtering fails
+        start_date = end_date = None
+    
+    # Report over the whole range, generated in the background so this page stays responsive
+    if start_date and end_date:
+        st.markdown("### Full Report")
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            template = st.selectbox("Template", list(REPORT_TEMPLATES), format_func=REPORT_TEMPLATES.get)
+        with col2:
+            regenerate = st.checkbox("Regenerate", help="Rebuild the report even if it was already generated")
+        if st.button("📄 Generate Report"):
+            user_id, username = st.session_state.user_id, st.session_state.username
+            # The row count and newest id make new predictions in the range a different job,
+            # so a finished report for the same dates is only reused while it is still current
+            params = {
+                'start': start_date.isoformat(), 'end': end_date.isoformat(), 'template': template,
+                'include_archive': include_archive,
+                'rows': len(filtered_history), 'max_id': max(record[0] for record in filtered_history),
+            }
+            get_report_jobs().submit(
+                'report', user_id, params,
+                lambda progress: build_report(user_id, username, start_date, end_date, template, include_archive, progress),
+                filename=f"medical_report_{start_date:%Y%m%d}_{end_date:%Y%m%d}_{template}.pdf",
+                force=regenerate,
+            )
+        active = any(job['status'] in ('queued', 'running') for job in get_report_jobs().for_owner(st.session_state.user_id, kind='report'))
+        st.fragment(show_report_jobs, run_every=2 if active else None)(active)
     
     # Display filtered history
     for record in filtered_history:
-        id, prediction, confidence_benign, confidence_malicious, input_data_str, notes, timestamp = record
+        id, prediction, confidence_benign, confidence_malicious, input_data_str, notes, timestamp, confirmed = record
         
         with st.expander(f"Prediction {id} - {timestamp}"):
             col1, col2 = st.columns(2)
@@ -647,6 +1135,28 @@ def show_history():
                 st.markdown(f"**Prediction:** {prediction}")
                 st.markdown(f"**Confidence (Benign):** {confidence_benign:.3f}")
                 st.markdown(f"**Confidence (Malicious):** {confidence_malicious:.3f}")
+                
+                # Confirmed outcome, used by the scheduled model refresh (model/refresh.py);
+                # archived rows are no longer in the table, so they are read-only
+                if id in archived_ids:
+                    st.markdown(f"**Confirmed diagnosis:** {confirmed or 'Not confirmed'} (archived)")
+                else:
+                    outcomes = ["Not confirmed", "Benign", "Malignant"]
+                    outcome = st.selectbox(
+                        "Confirmed diagnosis", outcomes,
+                        index=outcomes.index(confirmed) if confirmed else 0, key=f"outcome_{id}"
+                    )
+                    if outcome != (confirmed or "Not confirmed"):
+                        if st.button("Save outcome", key=f"save_outcome_{id}"):
+                            success, message = db.confirm_diagnosis(
+                                id, st.session_state.user_id, None if outcome == "Not confirmed" else outcome
+                            )
+                            if success:
+                                # Similar cases should show the confirmed label from now on
+                                current_case_base().forget_user(st.session_state.user_id)
+                                st.success(message)
+                            else:
+                                st.error(message)
             
             with col2:
                 if notes:
@@ -654,7 +1164,8 @@ def show_history():
                 
                 # Generate individual report button
                 if st.button(f"🔄 Generate Report #{id}"):
-                    report_pdf = generate_single_report(record, st.session_state.username)
+                    with span("pdf.single_report"):
+                        report_pdf = generate_single_report(record, st.session_state.username)
                     st.download_button(
                         label=f"📥 Download Report #{id}",
                         data=report_pdf,
@@ -663,6 +1174,9 @@ def show_history():
                     )
 
 def show_dashboard():
+    from database import Database
+    from partitions import live_cutoff
+
     st.markdown("""
         <div class="dashboard-container">
             <h2>Analytics Dashboard</h2>
@@ -672,10 +1186,11 @@ def show_dashboard():
     
     # Get user history
     db = Database()
-    history = db.get_user_history(st.session_state.user_id)
+    history = db.get_user_history(st.session_state.user_id, since=live_cutoff())
     
     if not history:
         st.info("No predictions available yet. Make some predictions to see analytics!")
+        show_drift()
         return
     
     # Summary Statistics in Cards
@@ -715,7 +1230,7 @@ def show_dashboard():
     recent_predictions.reverse()  # Show newest first
     
     for record in recent_predictions:
-        id, prediction, conf_benign, conf_malicious, _, notes, timestamp = record
+        id, prediction, conf_benign, conf_malicious, _, notes, timestamp, _ = record
         
         # Color coding for prediction type
         pred_color = "#ff4b4b" if prediction == "Malignant" else "#00cc00"
@@ -734,6 +1249,71 @@ def show_dashboard():
             """,
             unsafe_allow_html=True
         )
+    
+    show_drift()
+
+@st.cache_resource
+def get_drift_monitor():
+    """Process-wide drift monitor, compared against the training data"""
+    from drift import DriftMonitor
+
+    X = get_clean_data().drop(['diagnosis'], axis=1)
+    return DriftMonitor(
+        X.values, X.columns, path=os.environ.get("CANCERSENSE_DRIFT_STATE", "logs/drift.npz")
+    )
+
+def show_drift():
+    import pandas as pd
+    import plotly.graph_objects as go
+
+    rows, n_total, n_window = get_drift_monitor().scores()
+    
+    st.markdown("### Input Drift")
+    if not n_window:
+        st.info("No prediction inputs recorded yet.")
+        return
+    
+    drifted = [r['feature'] for r in rows if r['status'] == 'drift']
+    st.caption(f"Last {n_window} prediction inputs compared with the training data ({n_total} inputs since the monitor started)")
+    if n_window < get_drift_monitor().min_window:
+        st.info(f"Drift is assessed once {get_drift_monitor().min_window} inputs have been recorded; the scores below are not yet reliable.")
+    elif drifted:
+        st.warning(f"Drift detected in: {', '.join(drifted)}")
+    
+    top = rows[:10][::-1]
+    colors = {'drift': '#ff4b4b', 'watch': '#ffa500', 'stable': '#00cc00'}
+    fig = go.Figure(go.Bar(
+        x=[r['psi'] for r in top],
+        y=[r['feature'].replace('_', ' ') for r in top],
+        orientation='h',
+        marker_color=[colors.get(r['status'], '#999999') for r in top]
+    ))
+    fig.update_layout(title="Population stability index (top 10)", xaxis_title="PSI", showlegend=False)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    with st.expander("All features"):
+        st.dataframe(
+            pd.DataFrame([{
+                'Feature': r['feature'],
+                'Status': r['status'],
+                'PSI': round(r['psi'], 3),
+                'KS': round(r['ks'], 3),
+                'Mean shift (SD)': round(r['mean_shift'], 2),
+                'SD ratio': round(r['std_ratio'], 2) if r['std_ratio'] is not None else None,
+            } for r in rows]),
+            hide_index=True,
+            use_container_width=True
+        )
+
+@st.cache_resource
+def schema_error():
+    """Why the database can't serve this version of the app, or None; checked once per process"""
+    from database import Database
+
+    if not Database().has_feedback_columns():
+        return "The database schema is out of date: run `python app/migrate.py`, then restart the app."
+    return None
+
 
 def main():
     st.set_page_config(
@@ -743,10 +1323,15 @@ def main():
         initial_sidebar_state="collapsed"
     )
     
+    error = schema_error()
+    if error:
+        st.error(error)
+        st.stop()
+    
     init_session_state()
     
-    with open("assets/style.css") as f:
-        st.markdown("<style>{}</style>".format(f.read()), unsafe_allow_html=True)
+    # The stylesheet is read once per process; it still has to be emitted on every run
+    st.markdown(load_css(), unsafe_allow_html=True)
     
     if st.session_state.page == 'login':
         login_form()
@@ -783,14 +1368,19 @@ def main():
             
         # Content based on current view
         if st.session_state.current_view == 'predictor':
-            with st.sidebar:
-                #st.markdown('<h3 style="color: #1e3d7b;">Cell Nuclei Measurements</h3>', unsafe_allow_html=True)
-                input_data = add_sidebar()
-            radar_chart = get_radar_chart(input_data)
-            st.plotly_chart(radar_chart)
-            add_predictions(input_data)
+            init_measurements()
+            batch_mode = st.sidebar.toggle(
+                "Apply measurement changes in batches", key="batch_inputs", on_change=reseed_sliders,
+                help="Edit several measurements and apply them together instead of updating after every slider move"
+            )
+            if batch_mode:
+                add_sidebar()
+            show_predictor(batch_mode)
+            add_save_form()
         elif st.session_state.current_view == 'dashboard':
             show_dashboard()
+        elif st.session_state.current_view == 'metrics' and is_admin():
+            show_metrics()
         else:
             show_history()
         
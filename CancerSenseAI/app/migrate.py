@@ -0,0 +1,22 @@
+"""
+Schema migrations for the columns added to prediction_history after the
+original tables were created (confirmed outcomes).
+
+Run once after upgrading, before starting the app. It is safe to rerun:
+
+    python app/migrate.py
+
+The app itself never alters tables, so its MySQL user needs no ALTER
+privilege. Adding columns to a large prediction_history can take a while.
+"""
+from database import Database
+
+
+def main():
+    db = Database()
+    db.ensure_feedback_columns()
+    print("prediction_history is up to date.")
+
+
+if __name__ == '__main__':
+    main()
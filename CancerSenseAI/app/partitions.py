@@ -0,0 +1,301 @@
+"""
+Monthly partitioning and cold-data archiving for prediction_history.
+
+    python app/partitions.py migrate              # one-off: partition the table by month
+    python app/partitions.py extend --ahead 3     # create partitions for the coming months
+    python app/partitions.py archive --older-than 12
+    python app/partitions.py status
+
+`migrate` rebuilds prediction_history as RANGE partitions with one partition
+per calendar month (pYYYYMM) plus a catch-all pmax. MySQL requires every
+unique key to contain the partitioning column, so the primary key becomes
+(id, timestamp). Partitioned InnoDB tables can't have foreign keys, so any
+foreign keys on the table are dropped.
+
+`archive` streams every partition that ended more than N months ago into a
+gzip-compressed JSON-lines file under archive/prediction_history/. It checks
+the row count, then drops the partition, which is instant compared with a
+DELETE. A manifest records which users appear in each file, so on-demand
+reads for one user only open the months that contain them.
+
+Hot-path queries (history, dashboard) start at the first month that hasn't
+been archived (`live_cutoff`). They never skip rows that are still in the
+table, and MySQL prunes the partitions that were dropped.
+
+Run `extend` and `archive` on a schedule, e.g. monthly from cron.
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import re
+
+from database import Database
+from telemetry import get_logger
+
+logger = get_logger("partitions")
+
+TABLE = "prediction_history"
+ARCHIVE_DIR = os.environ.get("CANCERSENSE_ARCHIVE_DIR", "archive/prediction_history")
+HOT_MONTHS = int(os.environ.get("CANCERSENSE_HOT_MONTHS", "12"))
+COLUMNS = "id, prediction, confidence_benign, confidence_malicious, input_data, notes, timestamp, confirmed_diagnosis"
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def hot_cutoff(months=HOT_MONTHS):
+    """First day of the oldest month still served from the live table"""
+    return add_months(month_start(datetime.date.today()), -(months - 1))
+
+
+def partition_name(month):
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+class PartitionManager:
+    def __init__(self, db=None, table=TABLE, archive_dir=ARCHIVE_DIR):
+        self.db = db or Database()
+        self.db.ensure_connection()
+        self.table = table
+        self.archive_dir = archive_dir
+
+    def _execute(self, query, params=()):
+        self.db.cursor.execute(query, params)
+        return self.db.cursor.fetchall() if self.db.cursor.with_rows else None
+
+    def _column_type(self):
+        return self._execute("""
+            SELECT DATA_TYPE FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = 'timestamp'
+        """, (self.table,))[0][0].lower()
+
+    def _function(self):
+        # RANGE on a TIMESTAMP column needs UNIX_TIMESTAMP(), DATETIME works with TO_DAYS()
+        return "UNIX_TIMESTAMP" if self._column_type() == "timestamp" else "TO_DAYS"
+
+    def _definitions(self, months):
+        function = self._function()
+        return ",\n".join(
+            f"PARTITION {partition_name(m)} VALUES LESS THAN ({function}('{add_months(m, 1).isoformat()} 00:00:00'))"
+            for m in months
+        )
+
+    def partitions(self):
+        """[(name, description, rows)] in partition order; empty if the table isn't partitioned"""
+        rows = self._execute("""
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+            FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND table_name = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """, (self.table,))
+        return rows or []
+
+    def month_partitions(self):
+        """{month start date: partition name} for the monthly partitions"""
+        months = {}
+        for name, _, _ in self.partitions():
+            match = re.fullmatch(r"p(\d{4})(\d{2})", name)
+            if match:
+                months[datetime.date(int(match.group(1)), int(match.group(2)), 1)] = name
+        return months
+
+    def migrate(self, months_ahead=3):
+        if self.partitions():
+            logger.info("Table is already partitioned", extra={'table': self.table})
+            return False
+
+        first = self._execute(f"SELECT MIN(timestamp) FROM {self.table}")[0][0] or datetime.datetime.now()
+        months = []
+        month = month_start(first.date())
+        last = add_months(month_start(datetime.date.today()), months_ahead)
+        while month <= last:
+            months.append(month)
+            month = add_months(month, 1)
+
+        foreign_keys = self._execute("""
+            SELECT CONSTRAINT_NAME FROM information_schema.table_constraints
+            WHERE table_schema = DATABASE() AND table_name = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+        """, (self.table,))
+        for (name,) in foreign_keys:
+            self._execute(f"ALTER TABLE {self.table} DROP FOREIGN KEY `{name}`")
+
+        # The partitioning column must be part of the primary key and can't be NULL
+        self._execute(f"ALTER TABLE {self.table} MODIFY timestamp {self._column_type()} NOT NULL DEFAULT CURRENT_TIMESTAMP")
+        self._execute(f"ALTER TABLE {self.table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)")
+        self._execute(f"""
+            ALTER TABLE {self.table} PARTITION BY RANGE ({self._function()}(timestamp)) (
+                {self._definitions(months)},
+                PARTITION pmax VALUES LESS THAN MAXVALUE
+            )
+        """)
+        self._ensure_index()
+        self.db.conn.commit()
+        logger.info("Partitioned table by month", extra={'table': self.table, 'partitions': len(months)})
+        return True
+
+    def _ensure_index(self):
+        # History queries filter on user and time; this index lets them stay within a partition
+        exists = self._execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = 'idx_user_timestamp'
+        """, (self.table,))[0][0]
+        if not exists:
+            self._execute(f"ALTER TABLE {self.table} ADD INDEX idx_user_timestamp (user_id, timestamp)")
+
+    def extend(self, months_ahead=3):
+        """Split pmax so that every month up to `months_ahead` from now has its own partition"""
+        existing = self.month_partitions()
+        if not existing:
+            raise RuntimeError(f"{self.table} is not partitioned, run `migrate` first")
+        month = add_months(max(existing), 1)
+        last = add_months(month_start(datetime.date.today()), months_ahead)
+        new = []
+        while month <= last:
+            new.append(month)
+            month = add_months(month, 1)
+        if not new:
+            return []
+        self._execute(f"""
+            ALTER TABLE {self.table} REORGANIZE PARTITION pmax INTO (
+                {self._definitions(new)},
+                PARTITION pmax VALUES LESS THAN MAXVALUE
+            )
+        """)
+        logger.info("Added partitions", extra={'table': self.table, 'partitions': [partition_name(m) for m in new]})
+        return new
+
+    def archive(self, older_than_months=HOT_MONTHS, batch_size=10000):
+        """Move every monthly partition before the hot window to compressed files, then drop it"""
+        cutoff = hot_cutoff(older_than_months)
+        manifest = load_manifest(self.archive_dir)
+        archived = []
+        for month, name in sorted(self.month_partitions().items()):
+            if month >= cutoff:
+                break
+            rows, users = self._export_partition(month, name, batch_size)
+            self._execute(f"ALTER TABLE {self.table} DROP PARTITION {name}")
+            # Listed only once the rows have left the table, so they are never read from both
+            manifest[month.strftime("%Y-%m")] = {'file': f"{month:%Y-%m}.jsonl.gz", 'rows': rows, 'users': sorted(users)}
+            save_manifest(self.archive_dir, manifest)
+            logger.info("Archived partition", extra={'partition': name, 'rows': rows})
+            archived.append((name, rows))
+        return archived
+
+    def _export_partition(self, month, name, batch_size):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{month:%Y-%m}.jsonl.gz")
+        tmp_path = path + ".tmp"
+        users = set()
+        rows = 0
+
+        # Unbuffered cursor so a large partition is streamed instead of loaded at once
+        cursor = self.db.conn.cursor(buffered=False)
+        cursor.execute(f"SELECT user_id, {COLUMNS} FROM {self.table} PARTITION ({name}) ORDER BY user_id, timestamp")
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for user_id, *record in batch:
+                    users.add(user_id)
+                    f.write(json.dumps([user_id] + record, default=str) + "\n")
+                rows += len(batch)
+        cursor.close()
+
+        expected = self._execute(f"SELECT COUNT(*) FROM {self.table} PARTITION ({name})")[0][0]
+        if rows != expected:
+            os.remove(tmp_path)
+            raise RuntimeError(f"Exported {rows} rows from {name} but it holds {expected}, partition kept")
+        os.replace(tmp_path, path)
+        return rows, users
+
+
+def load_manifest(archive_dir=ARCHIVE_DIR):
+    path = os.path.join(archive_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(archive_dir, manifest):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, "manifest.json")
+    with open(path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def live_cutoff(archive_dir=ARCHIVE_DIR):
+    """
+    First day after the newest archived month, or None if nothing has been
+    archived; every prediction from this day on is still in the live table
+    """
+    manifest = load_manifest(archive_dir)
+    if not manifest:
+        return None
+    newest = max(manifest)
+    return add_months(datetime.date(int(newest[:4]), int(newest[5:7]), 1), 1)
+
+
+def read_archive(user_id, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    """
+    Archived predictions of one user in the same tuple layout as
+    Database.get_user_history, optionally limited to [start, end] dates
+    """
+    records = []
+    for month, entry in sorted(load_manifest(archive_dir).items()):
+        month_first = datetime.date(int(month[:4]), int(month[5:7]), 1)
+        if user_id not in entry['users']:
+            continue
+        if (start and add_months(month_first, 1) <= start) or (end and month_first > end):
+            continue
+        with gzip.open(os.path.join(archive_dir, entry['file']), 'rt', encoding='utf-8') as f:
+            for line in f:
+                row_user, id, prediction, benign, malignant, input_data, notes, timestamp, confirmed = json.loads(line)
+                if row_user != user_id:
+                    continue
+                timestamp = datetime.datetime.fromisoformat(timestamp)
+                if (start and timestamp.date() < start) or (end and timestamp.date() > end):
+                    continue
+                records.append((id, prediction, benign, malignant, input_data, notes, timestamp, confirmed))
+    return sorted(records, key=lambda r: r[6], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of prediction_history")
+    sub = parser.add_subparsers(dest='command', required=True)
+    migrate = sub.add_parser('migrate', help='partition the table by month (one-off)')
+    migrate.add_argument('--ahead', type=int, default=3, help='future months to create partitions for')
+    extend = sub.add_parser('extend', help='create partitions for the coming months')
+    extend.add_argument('--ahead', type=int, default=3)
+    archive = sub.add_parser('archive', help='move old partitions to compressed files')
+    archive.add_argument('--older-than', type=int, default=HOT_MONTHS, help='months kept in the live table')
+    sub.add_parser('status', help='list partitions and archived months')
+    args = parser.parse_args()
+
+    manager = PartitionManager()
+    if args.command == 'migrate':
+        print("Partitioned." if manager.migrate(args.ahead) else "Already partitioned.")
+    elif args.command == 'extend':
+        print(f"Added {len(manager.extend(args.ahead))} partitions.")
+    elif args.command == 'archive':
+        for name, rows in manager.archive(args.older_than):
+            print(f"Archived {name}: {rows} rows")
+    else:
+        for name, description, rows in manager.partitions():
+            print(f"{name:<10}{rows:>12} rows  < {description}")
+        for month, entry in sorted(load_manifest().items()):
+            print(f"{month:<10}{entry['rows']:>12} rows  archived in {entry['file']}")
+
+
+if __name__ == '__main__':
+    main()
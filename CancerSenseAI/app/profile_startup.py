@@ -0,0 +1,110 @@
+"""
+Import-time and cold-start profile of the app.
+
+Each view is opened by running the real app/main.py through Streamlit's
+AppTest harness, in a fresh interpreter so nothing is already imported or
+cached. The session is seeded as logged in, so every measurement is exactly
+what the first visit to that view costs:
+
+  * the login page, which is what every new session pays up front,
+  * the first open of each view, with the imports and data loading its own
+    functions trigger,
+  * the slowest modules in the app's import tree, from `python -X importtime`.
+
+The views talk to MySQL as usual; pass --local-db to use the in-memory
+stand-in from app/loadtest.py instead (the MySQL connector import is then
+not counted).
+
+Run from the project root:
+
+    python app/profile_startup.py
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(APP_DIR)
+
+VIEWS = ['login', 'predictor', 'dashboard', 'history']
+
+TIMER = """
+import time, sys
+sys.path.insert(0, {app_dir!r})
+from streamlit.testing.v1 import AppTest
+if {local_db!r}:
+    from loadtest import install_local_database
+    install_local_database(0.0)
+
+def open_view(view):
+    at = AppTest.from_file({app_path!r}, default_timeout=300)
+    if view != 'login':
+        at.session_state['logged_in'] = True
+        at.session_state['username'] = 'profile'
+        at.session_state['user_id'] = 0
+        at.session_state['page'] = 'main'
+        at.session_state['current_view'] = view
+    start = time.perf_counter()
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return time.perf_counter() - start
+
+{body}
+"""
+
+
+def run_timer(view, local_db):
+    code = TIMER.format(
+        app_dir=APP_DIR, app_path=os.path.join(APP_DIR, "main.py"), local_db=local_db,
+        body=f"print(open_view({view!r}))"
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.split()[-1])
+
+
+def import_tree(local_db, top=15):
+    """Slowest modules (cumulative microseconds) when opening every view in one interpreter"""
+    code = TIMER.format(
+        app_dir=APP_DIR, app_path=os.path.join(APP_DIR, "main.py"), local_db=local_db,
+        body="\n".join(f"open_view({view!r})" for view in VIEWS)
+    )
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT_DIR, capture_output=True, text=True
+    ).stderr
+
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        # Nested imports are indented under their parent, keep top-level packages only
+        name = name[1:]
+        if not name.startswith(' ') and '.' not in name:
+            rows.append((int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the app's cold start, view by view")
+    parser.add_argument('--local-db', action='store_true', help='use the in-memory database stand-in instead of MySQL')
+    args = parser.parse_args()
+
+    print("Cold start (fresh interpreter per view)")
+    print("-" * 50)
+    print(f"{'view':<16}{'first open':>14}")
+    for view in VIEWS:
+        print(f"{view:<16}{run_timer(view, args.local_db) * 1000:>11.1f} ms")
+
+    print("\nSlowest top-level imports (cumulative)")
+    print("-" * 50)
+    for cumulative_us, name in import_tree(args.local_db):
+        print(f"{name:<34}{cumulative_us / 1000:>11.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Read/write splitting between the MySQL primary and its read replicas.
+
+Writes, and any query not marked as a read, go to the primary. The reads in
+Database (history, user lookups, login) go to a replica when one is usable.
+Replicas are taken in turn, and a replica is usable when it is:
+
+  * reachable. A replica that refuses a connection or fails a query is
+    skipped for `retry_after` seconds, and the read is retried on the primary.
+  * fresh enough. Its replication lag (Seconds_Behind_Source, checked at most
+    every `check_interval` seconds) is at most `max_lag` seconds.
+  * not running behind the reader. After a write, Database records the
+    primary's @@gtid_executed against the user it touched. That user's reads
+    go to a replica only once GTID_SUBSET confirms the replica has applied
+    those transactions, so whoever just saved a prediction or registered sees
+    it straight away, in every tab. Without GTIDs (gtid_mode=OFF), the user's
+    reads stay on the primary for `remember` seconds after the write.
+
+With no replicas configured, everything runs on the primary as before.
+
+    CANCERSENSE_DB_PRIMARY=localhost:3309
+    CANCERSENSE_DB_REPLICAS=localhost:3310,localhost:3311
+    CANCERSENSE_DB_MAX_LAG=5
+
+The routing state lives in this process. Check the endpoints and see where
+reads would go:
+
+    python app/replicas.py
+"""
+import itertools
+import os
+import threading
+import time
+
+from telemetry import get_logger
+
+logger = get_logger("replicas")
+
+
+def parse_endpoint(value, default_port=3306):
+    host, _, port = value.strip().partition(':')
+    return host, int(port or default_port)
+
+
+class ReplicaRouter:
+    def __init__(self, primary, replicas=(), max_lag=5.0, check_interval=5.0, retry_after=30.0, remember=60.0):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.remember = remember
+        self.lock = threading.Lock()
+        self.turn = itertools.count()
+        self.health = {r: {'lag': None, 'checked': 0.0, 'down_until': 0.0, 'error': None} for r in self.replicas}
+        self.writes = {}
+        self.counts = {'primary': 0, 'replica': 0, 'sticky': 0, 'lagging': 0, 'failover': 0}
+
+    @classmethod
+    def from_env(cls):
+        primary = parse_endpoint(os.environ.get("CANCERSENSE_DB_PRIMARY", "localhost:3309"))
+        replicas = [parse_endpoint(r) for r in os.environ.get("CANCERSENSE_DB_REPLICAS", "").split(',') if r.strip()]
+        return cls(primary, replicas, max_lag=float(os.environ.get("CANCERSENSE_DB_MAX_LAG", "5")))
+
+    def note_write(self, keys, gtid):
+        """
+        Remember that data read under these keys (e.g. "user:42") changed on
+        the primary, up to the GTID set `gtid` ('' when GTIDs are off)
+        """
+        now = time.monotonic()
+        with self.lock:
+            for key in keys:
+                self.writes[key] = (now, gtid)
+            horizon = now - self.remember
+            self.writes = {k: w for k, w in self.writes.items() if w[0] > horizon}
+
+    def pending_writes(self, keys):
+        """GTID sets a replica must have applied before it serves reads under these keys"""
+        with self.lock:
+            return [self.writes[k][1] for k in keys if k in self.writes]
+
+    def candidates(self):
+        """Replicas worth trying for a read, in round-robin order"""
+        if not self.replicas:
+            return []
+        now = time.monotonic()
+        start = next(self.turn) % len(self.replicas)
+        with self.lock:
+            return [
+                r for r in self.replicas[start:] + self.replicas[:start]
+                if self.health[r]['down_until'] <= now
+            ]
+
+    def needs_check(self, replica):
+        with self.lock:
+            return time.monotonic() - self.health[replica]['checked'] >= self.check_interval
+
+    def set_lag(self, replica, lag):
+        with self.lock:
+            self.health[replica].update(lag=lag, checked=time.monotonic(), error=None)
+
+    def mark_down(self, replica, error):
+        with self.lock:
+            self.health[replica].update(down_until=time.monotonic() + self.retry_after, error=str(error))
+            self.counts['failover'] += 1
+        logger.warning("Replica unavailable, reading from the primary", extra={
+            'replica': f"{replica[0]}:{replica[1]}", 'error': str(error), 'retry_after': self.retry_after
+        })
+
+    def usable(self, replica):
+        """Whether this (reachable) replica is replicating and within max_lag"""
+        with self.lock:
+            lag = self.health[replica]['lag']
+            if lag is None or lag > self.max_lag:
+                self.counts['lagging'] += 1
+                return False
+            return True
+
+    def count(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def status(self):
+        now = time.monotonic()
+        with self.lock:
+            replicas = {
+                f"{host}:{port}": {
+                    'lag': h['lag'],
+                    'down_for': max(h['down_until'] - now, 0.0),
+                    'error': h['error'],
+                }
+                for (host, port), h in self.health.items()
+            }
+            return replicas, dict(self.counts)
+
+
+def replica_lag(cursor):
+    """
+    Replication lag in seconds, or None if the server isn't replicating
+    (stopped, or not configured as a replica at all) and must not serve reads
+    """
+    try:
+        cursor.execute("SHOW REPLICA STATUS")
+        lag_column = 'Seconds_Behind_Source'
+    except Exception:
+        # MySQL before 8.0.22
+        cursor.execute("SHOW SLAVE STATUS")
+        lag_column = 'Seconds_Behind_Master'
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    lag = dict(zip([c[0] for c in cursor.description], row))[lag_column]
+    return None if lag is None else float(lag)
+
+
+router = ReplicaRouter.from_env()
+
+
+def main():
+    # Import through the module so this is the same router Database uses
+    import replicas
+    from database import Database
+
+    db = Database()
+    shared = replicas.router
+    for replica in shared.replicas:
+        host, port = replica
+        try:
+            lag = replica_lag(db.connect(replica).cursor(buffered=True))
+            shared.set_lag(replica, lag)
+            print(f"replica {host}:{port}: " + (f"lag {lag} s" if lag is not None else "not replicating"))
+        except Exception as e:
+            print(f"replica {host}:{port}: unreachable ({e})")
+    print(f"primary {shared.primary[0]}:{shared.primary[1]}: reachable")
+
+    print(f"\nA read for a user with no recent writes goes to: {db.read_target(['user:0'])}")
+    db.note_write('user:0')
+    print(f"The same read right after that user saves goes to: {db.read_target(['user:0'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+import numpy as np
+
+
+def sensitivity_sweep(model, scaler, input_array, lows, highs, n_points=100):
+    """
+    Malignant probability as each feature sweeps its range, others held fixed.
+
+    All n_features x n_points perturbed inputs are stacked into one matrix and
+    scored with a single scaler.transform + predict_proba call. Returns the
+    (n_features, n_points) grid of swept values and the matching probabilities.
+    """
+    x = np.asarray(input_array, dtype=float).ravel()
+    n_features = len(x)
+    grid = np.linspace(lows, highs, n_points, axis=1)
+
+    batch = np.tile(x, (n_features, n_points, 1))
+    features = np.arange(n_features)
+    batch[features, :, features] = grid
+
+    probs = model.predict_proba(scaler.transform(batch.reshape(-1, n_features)))[:, 1]
+    return grid, probs.reshape(n_features, n_points)
@@ -0,0 +1,182 @@
+"""
+Shadow evaluation of challenger models.
+
+The live model answers the request. Every challenger scores the same input
+later, in a small background thread pool, and the outputs are appended,
+next to the live prediction, to a JSON-lines log. The request only pays for
+handing the job to the pool. When the pool falls behind, new jobs are
+dropped (and counted) instead of queueing without bound.
+
+Challengers come from model/challengers.pkl (the runners-up saved by
+model/main.py, as {name: {'model': ..., 'scaler': ...}}) plus any pickles in
+model/challengers/, each either a model or {'model': ..., 'scaler': ...} for
+models trained with a different scaler. The file name is used as the
+challenger's name. Entries in challengers.pkl must carry their scaler: the
+live scaler.pkl may have been replaced by a later retrain.
+
+Summarize the log, overall and per day:
+
+    python app/shadow.py logs/shadow.jsonl
+"""
+import datetime
+import glob
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from telemetry import get_logger, percentile
+
+logger = get_logger("shadow")
+
+LOG_PATH = os.environ.get("CANCERSENSE_SHADOW_LOG", "logs/shadow.jsonl")
+
+
+def load_challengers(path="model/challengers.pkl", directory="model/challengers"):
+    """Return {name: (model, scaler or None)}; a None scaler means the live scaler applies"""
+    challengers = {}
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            for name, obj in pickle.load(f).items():
+                if isinstance(obj, dict):
+                    challengers[name] = (obj['model'], obj['scaler'])
+                else:
+                    # Saved before challengers kept their scaler; the live one may not match
+                    logger.warning("Challenger has no scaler, skipped; retrain with model/main.py", extra={'challenger': name})
+    for file in sorted(glob.glob(os.path.join(directory, "*.pkl"))):
+        with open(file, 'rb') as f:
+            obj = pickle.load(f)
+        name = os.path.splitext(os.path.basename(file))[0]
+        challengers[name] = (obj['model'], obj.get('scaler')) if isinstance(obj, dict) else (obj, None)
+    return challengers
+
+
+class ShadowEvaluator:
+    def __init__(self, challengers, log_path=LOG_PATH, workers=2, max_pending=200, window=1000):
+        self.challengers = challengers
+        self.log_path = log_path
+        self.max_pending = max_pending
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shadow")
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.dropped = 0
+        self.stats = {
+            name: {'count': 0, 'agree': 0, 'abs_diff': 0.0, 'latencies': deque(maxlen=window)}
+            for name in challengers
+        }
+        self.live_latencies = deque(maxlen=window)
+
+    def submit(self, input_array, input_scaled, live_prediction, live_probability, live_latency):
+        """Queue the challengers for one request; never blocks the caller"""
+        if not self.challengers:
+            return
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self.pending += 1
+        self.pool.submit(self._score, input_array, input_scaled, int(live_prediction), float(live_probability), live_latency)
+
+    def _score(self, input_array, input_scaled, live_prediction, live_probability, live_latency):
+        try:
+            outputs = {}
+            for name, (model, scaler) in self.challengers.items():
+                start = time.perf_counter()
+                X = scaler.transform(input_array) if scaler is not None else input_scaled
+                probability = float(model.predict_proba(X)[0][1])
+                outputs[name] = {
+                    'prediction': int(model.predict(X)[0]),
+                    'probability': probability,
+                    'latency': time.perf_counter() - start,
+                }
+            self._record(live_prediction, live_probability, live_latency, outputs)
+        except Exception:
+            logger.exception("Shadow scoring failed")
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def _record(self, live_prediction, live_probability, live_latency, outputs):
+        entry = {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'live': {'prediction': live_prediction, 'probability': live_probability, 'latency': live_latency},
+            'challengers': outputs,
+        }
+        with self.lock:
+            self.live_latencies.append(live_latency)
+            for name, output in outputs.items():
+                stats = self.stats[name]
+                stats['count'] += 1
+                stats['agree'] += int(output['prediction'] == live_prediction)
+                stats['abs_diff'] += abs(output['probability'] - live_probability)
+                stats['latencies'].append(output['latency'])
+            try:
+                os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError:
+                logger.exception("Could not write shadow log", extra={'path': self.log_path})
+
+    def report(self):
+        """Agreement with the live model and latency per challenger since this process started"""
+        with self.lock:
+            live = sorted(self.live_latencies)
+            rows = {
+                name: summarize(s['count'], s['agree'], s['abs_diff'], sorted(s['latencies']))
+                for name, s in self.stats.items()
+            }
+            rows['(live)'] = summarize(len(live), len(live), 0.0, live)
+            return rows, self.pending, self.dropped
+
+
+def summarize(count, agree, abs_diff, sorted_latencies):
+    return {
+        'count': count,
+        'agreement': agree / count if count else None,
+        'mean_abs_diff': abs_diff / count if count else None,
+        'p50_latency': percentile(sorted_latencies, 50),
+        'p95_latency': percentile(sorted_latencies, 95),
+    }
+
+
+def summarize_log(path=LOG_PATH):
+    """Stream the shadow log into {day: {challenger: summary}}, plus an 'all' entry over the whole log"""
+    totals = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            live = entry['live']
+            for day in (entry['time'][:10], 'all'):
+                for name, output in list(entry['challengers'].items()) + [('(live)', live)]:
+                    t = totals.setdefault(day, {}).setdefault(name, [0, 0, 0.0, []])
+                    t[0] += 1
+                    t[1] += int(output['prediction'] == live['prediction'])
+                    t[2] += abs(output['probability'] - live['probability'])
+                    t[3].append(output['latency'])
+    return {
+        day: {name: summarize(c, a, d, sorted(l)) for name, (c, a, d, l) in names.items()}
+        for day, names in sorted(totals.items())
+    }
+
+
+def print_summary(summary):
+    for day, names in summary.items():
+        print(f"\n{day}")
+        print("-"*78)
+        print(f"{'model':<28}{'count':>8}{'agreement':>12}{'mean |dp|':>12}{'p50 ms':>9}{'p95 ms':>9}")
+        for name, s in sorted(names.items()):
+            print(
+                f"{name:<28}{s['count']:>8}{s['agreement']:>12.2%}{s['mean_abs_diff']:>12.4f}"
+                f"{s['p50_latency'] * 1000:>9.2f}{s['p95_latency'] * 1000:>9.2f}"
+            )
+
+
+if __name__ == '__main__':
+    print_summary(summarize_log(sys.argv[1] if len(sys.argv) > 1 else LOG_PATH))
@@ -0,0 +1,162 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+METRICS_PATH = os.environ.get("CANCERSENSE_METRICS_PATH", "logs/metrics.prom")
+EXPORT_INTERVAL = 15  # seconds between Prometheus file rewrites
+WINDOW = 1000  # most recent spans kept per stage for the rolling percentiles
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra=` fields merged in"""
+
+    RESERVED = set(logging.makeLogRecord({}).__dict__) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({k: v for k, v in record.__dict__.items() if k not in self.RESERVED})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_logger(name):
+    """Logger under the app's namespace, configured once to emit JSON lines"""
+    root = logging.getLogger("cancersense")
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        root.addHandler(handler)
+        root.setLevel(os.environ.get("CANCERSENSE_LOG_LEVEL", "INFO"))
+        root.propagate = False
+    return root.getChild(name)
+
+
+logger = get_logger("telemetry")
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Tracer:
+    """
+    Records how long each named stage takes.
+
+    Only the last `window` durations per stage are kept, so memory stays
+    bounded and the percentiles follow recent behaviour. Counts and totals
+    are cumulative, as Prometheus expects.
+    """
+
+    def __init__(self, window=WINDOW, metrics_path=METRICS_PATH, export_interval=EXPORT_INTERVAL):
+        self.window = window
+        self.metrics_path = metrics_path
+        self.export_interval = export_interval
+        self.durations = {}
+        self.counts = {}
+        self.totals = {}
+        self.errors = {}
+        self.last_export = time.monotonic()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, **fields):
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, failed, **fields)
+
+    def record(self, stage, duration, failed=False, **fields):
+        with self.lock:
+            if stage not in self.durations:
+                self.durations[stage] = deque(maxlen=self.window)
+                self.counts[stage] = 0
+                self.totals[stage] = 0.0
+                self.errors[stage] = 0
+            self.durations[stage].append(duration)
+            self.counts[stage] += 1
+            self.totals[stage] += duration
+            self.errors[stage] += int(failed)
+            due = time.monotonic() - self.last_export >= self.export_interval
+            if due:
+                self.last_export = time.monotonic()
+
+        logger.debug("span", extra={'stage': stage, 'duration_ms': round(duration * 1000, 3), 'failed': failed, **fields})
+        if due:
+            self.export_prometheus()
+
+    def summary(self):
+        """Rolling p50/p95/p99 (seconds) plus cumulative counters for every stage"""
+        with self.lock:
+            snapshot = {
+                stage: (sorted(values), self.counts[stage], self.totals[stage], self.errors[stage])
+                for stage, values in self.durations.items()
+            }
+        return {
+            stage: {
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+                'count': count,
+                'total': total,
+                'errors': errors,
+            }
+            for stage, (values, count, total, errors) in sorted(snapshot.items())
+        }
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP cancersense_stage_duration_seconds Time spent in each app stage",
+            "# TYPE cancersense_stage_duration_seconds summary",
+        ]
+        errors = [
+            "# HELP cancersense_stage_errors_total Spans that ended with an exception",
+            "# TYPE cancersense_stage_errors_total counter",
+        ]
+        for stage, stats in self.summary().items():
+            label = stage.replace('\\', '\\\\').replace('"', '\\"')
+            for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                lines.append(f'cancersense_stage_duration_seconds{{stage="{label}",quantile="{quantile}"}} {stats[key]:.6f}')
+            lines.append(f'cancersense_stage_duration_seconds_sum{{stage="{label}"}} {stats["total"]:.6f}')
+            lines.append(f'cancersense_stage_duration_seconds_count{{stage="{label}"}} {stats["count"]}')
+            errors.append(f'cancersense_stage_errors_total{{stage="{label}"}} {stats["errors"]}')
+        return "\n".join(lines + errors) + "\n"
+
+    def export_prometheus(self, path=None):
+        """Rewrite the metrics file atomically so a scraper never reads a partial file"""
+        path = path or self.metrics_path
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception("Could not write metrics file", extra={'path': path})
+        return path
+
+
+# Process-wide tracer: imported modules survive Streamlit reruns, so every
+# session of this server process reports into the same figures
+tracer = Tracer()
+span = tracer.span
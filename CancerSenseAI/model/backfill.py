@@ -0,0 +1,237 @@
+"""
+Re-score every saved prediction with a new model.
+
+Saved predictions are read from prediction_history in id order, `--chunk-size`
+rows at a time. Each chunk is parsed and scored in a process pool with one
+scaler.transform, predict and predict_proba call. The results are written back
+in bulk to the rescored_* columns, next to the original prediction. Only a
+few chunks are in flight at once, so memory stays flat however large the
+table is.
+
+Progress is checkpointed in model/backfill_state.json after every chunk is
+written: the last id, the running totals, and the length of the flips CSV.
+An interrupted run picks up where it stopped; rerun the same command. Running
+it again after it finishes scores only the predictions saved since then. A
+different model file starts a new backfill (the checkpoint records the
+model's hash).
+
+Every prediction whose diagnosis changes is listed in model/backfill_flips.csv,
+and a summary of the flips (and, where clinicians confirmed the outcome, of
+which model was right) is printed at the end.
+
+    python model/backfill.py --model model/model.pkl --workers 4
+
+Predictions already moved to the archive (app/partitions.py) aren't in the
+table and aren't re-scored.
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import json
+import os
+import pickle as pickle
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dataset import load_clean_data
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from database import Database
+
+
+STATE_PATH = 'model/backfill_state.json'
+FLIPS_PATH = 'model/backfill_flips.csv'
+LABELS = ['Benign', 'Malignant']
+
+# set in every worker by init_worker
+_worker = {}
+
+
+def init_worker(model_path, scaler_path, columns):
+  with open(model_path, 'rb') as f:
+    _worker['model'] = pickle.load(f)
+  with open(scaler_path, 'rb') as f:
+    _worker['scaler'] = pickle.load(f)
+  _worker['columns'] = columns
+
+
+def score_chunk(rows):
+  """Score [(id, input_data JSON)] in one vectorized call; returns ids, predicted labels, P(malignant)"""
+  columns = _worker['columns']
+  ids, X = [], np.full((len(rows), len(columns)), np.nan)
+  for i, (id, input_data) in enumerate(rows):
+    ids.append(id)
+    try:
+      values = json.loads(input_data)
+      X[i] = [values.get(c, np.nan) for c in columns]
+    except (TypeError, ValueError):
+      pass
+  # rows with missing or unreadable measurements are left unscored
+  valid = ~np.isnan(X).any(axis=1)
+  ids = np.array(ids)[valid]
+  if not valid.any():
+    return ids, np.array([], dtype=int), np.array([])
+  X = _worker['scaler'].transform(X[valid])
+  # the label comes from predict, as in the app; for SVC it can disagree with predict_proba
+  return ids, _worker['model'].predict(X).astype(int), _worker['model'].predict_proba(X)[:, 1]
+
+
+def file_hash(path):
+  with open(path, 'rb') as f:
+    return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def new_state(model):
+  return {
+    'model': model, 'last_id': 0, 'flips_offset': 0,
+    'started': datetime.datetime.now().isoformat(timespec='seconds'), 'finished': None,
+    'rows': 0, 'skipped': 0, 'abs_diff': 0.0,
+    # transitions[old][new] over the re-scored rows
+    'transitions': {old: {new: 0 for new in LABELS} for old in LABELS},
+    # agreement with the confirmed diagnosis, where one exists
+    'confirmed': {'rows': 0, 'old_correct': 0, 'new_correct': 0},
+  }
+
+
+def load_state(model, restart):
+  if not restart and os.path.exists(STATE_PATH):
+    with open(STATE_PATH) as f:
+      state = json.load(f)
+    if state['model'] == model:
+      return state
+    print(f"Checkpoint is for model {state['model']}, starting a new backfill for {model}.")
+  return new_state(model)
+
+
+def save_state(state):
+  tmp_path = STATE_PATH + '.tmp'
+  with open(tmp_path, 'w') as f:
+    json.dump(state, f, indent=2)
+  os.replace(tmp_path, STATE_PATH)
+
+
+def read_chunks(db, last_id, chunk_size):
+  """Yield the stored rows in id order, chunk by chunk, with keyset pagination"""
+  while True:
+    rows = db.get_predictions_after(last_id, chunk_size)
+    if not rows:
+      return
+    yield rows
+    last_id = rows[-1][0]
+
+
+def record_chunk(state, rows, ids, predictions, probabilities, flips):
+  """Fold a scored chunk into the running totals and append its flips to the CSV"""
+  by_id = {row[0]: row for row in rows}
+  state['skipped'] += len(rows) - len(ids)
+  for id, new, probability in zip(ids.tolist(), predictions.tolist(), probabilities.tolist()):
+    _, user_id, old, old_probability, _, confirmed = by_id[id]
+    new = LABELS[new]
+    state['rows'] += 1
+    state['abs_diff'] += abs(probability - float(old_probability))
+    state['transitions'][old][new] += 1
+    if confirmed:
+      state['confirmed']['rows'] += 1
+      state['confirmed']['old_correct'] += int(old == confirmed)
+      state['confirmed']['new_correct'] += int(new == confirmed)
+    if new != old:
+      flips.writerow([id, user_id, old, new, f"{float(old_probability):.4f}", f"{probability:.4f}", confirmed or ''])
+
+
+def print_summary(state):
+  t = state['transitions']
+  rows = state['rows']
+  print("\n" + "="*50)
+  print(f"BACKFILL SUMMARY (model {state['model']})")
+  print("="*50)
+  print(f"Re-scored: {rows}, skipped (unreadable input): {state['skipped']}")
+  if not rows:
+    return
+  print(f"Mean |change in P(malignant)|: {state['abs_diff'] / rows:.4f}")
+  print(f"\n{'original':<12}{'-> Benign':>12}{'-> Malignant':>14}")
+  for old in LABELS:
+    print(f"{old:<12}{t[old]['Benign']:>12}{t[old]['Malignant']:>14}")
+  flipped = t['Benign']['Malignant'] + t['Malignant']['Benign']
+  print(f"\nFlipped: {flipped} ({flipped / rows:.2%}), "
+        f"Benign -> Malignant {t['Benign']['Malignant']}, Malignant -> Benign {t['Malignant']['Benign']}")
+  confirmed = state['confirmed']
+  if confirmed['rows']:
+    print(f"On {confirmed['rows']} confirmed outcomes: original model right {confirmed['old_correct'] / confirmed['rows']:.2%}, "
+          f"new model right {confirmed['new_correct'] / confirmed['rows']:.2%}")
+  print(f"Flipped predictions are listed in {FLIPS_PATH}")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Re-score saved predictions with a new model")
+  parser.add_argument('--model', default='model/model.pkl')
+  parser.add_argument('--scaler', default='model/scaler.pkl')
+  parser.add_argument('--chunk-size', type=int, default=5000, help='predictions read and scored at a time')
+  parser.add_argument('--workers', type=int, default=os.cpu_count(), help='scoring processes')
+  parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start over')
+  args = parser.parse_args()
+
+  model = f"{os.path.basename(args.model)}@{file_hash(args.model)}"
+  state = load_state(model, args.restart)
+  if state['last_id']:
+    print(f"Resuming after prediction {state['last_id']} ({state['rows']} re-scored so far).")
+
+  db = Database()
+  db.ensure_feedback_columns()
+  db.ensure_rescore_columns()
+  columns = list(load_clean_data("data/data.csv").columns.drop('diagnosis'))
+
+  # drop any flips written after the last checkpoint, they are redone below
+  if state['flips_offset'] and not os.path.exists(FLIPS_PATH):
+    print(f"{FLIPS_PATH} is missing, flips before this run are not listed.")
+    state['flips_offset'] = 0
+  with open(FLIPS_PATH, 'a+') as f:
+    f.truncate(state['flips_offset'])
+
+  start = time.perf_counter()
+  resumed_rows = state['rows']
+  with open(FLIPS_PATH, 'a', newline='') as f, \
+       ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(args.model, args.scaler, columns)) as pool:
+    flips = csv.writer(f)
+    if state['flips_offset'] == 0:
+      flips.writerow(['id', 'user_id', 'original', 'rescored', 'original_p_malignant', 'rescored_p_malignant', 'confirmed'])
+
+    # keep a few chunks in flight, and write them back in id order so the checkpoint is a single id
+    pending = deque()
+    chunks = read_chunks(db, state['last_id'], args.chunk_size)
+    while True:
+      while len(pending) < 2 * args.workers:
+        rows = next(chunks, None)
+        if rows is None:
+          break
+        pending.append((rows, pool.submit(score_chunk, [(row[0], row[4]) for row in rows])))
+      if not pending:
+        break
+
+      rows, future = pending.popleft()
+      ids, predictions, probabilities = future.result()
+      if len(ids):
+        db.save_rescores(
+          [(id, LABELS[p], prob) for id, p, prob in zip(ids.tolist(), predictions.tolist(), probabilities.tolist())],
+          model,
+        )
+      record_chunk(state, rows, ids, predictions, probabilities, flips)
+      f.flush()
+      state['last_id'] = rows[-1][0]
+      state['flips_offset'] = f.tell()
+      save_state(state)
+
+      elapsed = time.perf_counter() - start
+      print(f"  up to id {state['last_id']}: {state['rows']} rows ({(state['rows'] - resumed_rows) / max(elapsed, 1e-9):,.0f} rows/s)")
+
+  state['finished'] = datetime.datetime.now().isoformat(timespec='seconds')
+  save_state(state)
+  print_summary(state)
+
+
+if __name__ == '__main__':
+  main()
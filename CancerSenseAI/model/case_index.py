@@ -0,0 +1,235 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+
+LABELS = {0: 'Benign', 1: 'Malignant'}
+
+
+class CaseIndex:
+    """
+    Nearest-neighbour index that accepts appends without a full rebuild.
+
+    New cases land in a small buffer that is searched by brute force. When
+    the buffer fills up it becomes a KD-tree segment, and segments of similar
+    size are merged, so a case base of N rows is always spread over at most
+    O(log N) trees (a logarithmic method, as in Bentley & Saxe).
+    """
+
+    def __init__(self, n_features, buffer_size=256, leaf_size=40):
+        self.n_features = n_features
+        self.buffer_size = buffer_size
+        self.leaf_size = leaf_size
+        self.segments = []
+        self.buffer_X = np.empty((0, n_features))
+        self.buffer_labels = np.empty(0, dtype=np.int8)
+        self.buffer_ids = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return sum(len(s['labels']) for s in self.segments) + len(self.buffer_labels)
+
+    def _make_segment(self, X, labels, ids):
+        return {'tree': KDTree(X, leaf_size=self.leaf_size), 'X': X, 'labels': labels, 'ids': ids}
+
+    def add(self, X, labels, ids):
+        X = np.asarray(X, dtype=float).reshape(-1, self.n_features)
+        self.buffer_X = np.vstack([self.buffer_X, X])
+        self.buffer_labels = np.concatenate([self.buffer_labels, np.asarray(labels, dtype=np.int8)])
+        self.buffer_ids = np.concatenate([self.buffer_ids, np.asarray(ids, dtype=np.int64)])
+
+        if len(self.buffer_labels) >= self.buffer_size:
+            self.segments.append(self._make_segment(self.buffer_X, self.buffer_labels, self.buffer_ids))
+            self.buffer_X = np.empty((0, self.n_features))
+            self.buffer_labels = np.empty(0, dtype=np.int8)
+            self.buffer_ids = np.empty(0, dtype=np.int64)
+            self._merge_segments()
+
+    def rows(self):
+        """Every indexed case as (X, labels, ids)"""
+        return (
+            np.vstack([s['X'] for s in self.segments] + [self.buffer_X]),
+            np.concatenate([s['labels'] for s in self.segments] + [self.buffer_labels]),
+            np.concatenate([s['ids'] for s in self.segments] + [self.buffer_ids]),
+        )
+
+    def _merge_segments(self):
+        while len(self.segments) > 1 and len(self.segments[-2]['labels']) <= 2 * len(self.segments[-1]['labels']):
+            b = self.segments.pop()
+            a = self.segments.pop()
+            self.segments.append(self._make_segment(
+                np.vstack([a['X'], b['X']]),
+                np.concatenate([a['labels'], b['labels']]),
+                np.concatenate([a['ids'], b['ids']])
+            ))
+
+    def query(self, x, k=5):
+        """Return (distances, labels, ids) of the k nearest cases, closest first"""
+        x = np.asarray(x, dtype=float).reshape(1, -1)
+        dists, labels, ids = [], [], []
+
+        for segment in self.segments:
+            d, i = segment['tree'].query(x, k=min(k, len(segment['labels'])))
+            dists.append(d[0])
+            labels.append(segment['labels'][i[0]])
+            ids.append(segment['ids'][i[0]])
+
+        if len(self.buffer_labels):
+            d = np.sqrt(((self.buffer_X - x) ** 2).sum(axis=1))
+            dists.append(d)
+            labels.append(self.buffer_labels)
+            ids.append(self.buffer_ids)
+
+        if not dists:
+            return np.empty(0), np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int64)
+
+        dists = np.concatenate(dists)
+        order = np.argsort(dists)[:k]
+        return dists[order], np.concatenate(labels)[order], np.concatenate(ids)[order]
+
+
+class CaseBase:
+    """
+    Similar-case retrieval over the training set plus each user's saved predictions.
+
+    The training cases are indexed once and saved with the model artifacts.
+    Saved predictions are appended to a fixed-width binary log next to the
+    snapshot, so recording a new case costs one small write, and the log is
+    replayed into per-user indexes on load. Vectors are kept raw in the log
+    and standardized with the model's scaler when they are indexed.
+
+    The first time a user is queried, their saved predictions from the
+    database are loaded with `load_user`. This covers everything saved before
+    the log existed or by another app process. Those cases are labelled with
+    the confirmed diagnosis where one exists; otherwise the label is the
+    model's prediction, and query() reports which one it is.
+    """
+
+    def __init__(self, scaler, path='model/case_index.pkl'):
+        self.scaler = scaler
+        self.path = path
+        self.log_path = os.path.splitext(path)[0] + '.log'
+        self.n_features = len(scaler.mean_)
+        self.record = np.dtype([
+            ('user_id', np.int64), ('id', np.int64), ('label', np.int8),
+            ('x', np.float32, (self.n_features,))
+        ])
+        self.training = CaseIndex(self.n_features)
+        self.users = {}
+        self.loaded_users = set()
+        self.confirmed = {}
+        self.lock = threading.Lock()
+
+    def _scaler_key(self):
+        return (tuple(np.round(self.scaler.mean_, 8)), tuple(np.round(self.scaler.scale_, 8)))
+
+    def build(self, X, labels, ids=None):
+        """Index training rows given in raw (unscaled) feature space"""
+        X = np.asarray(X, dtype=float)
+        if ids is None:
+            ids = np.arange(len(X))
+        self.training = CaseIndex(self.n_features)
+        self.training.add(self.scaler.transform(X), labels, ids)
+
+    def save(self):
+        with open(self.path, 'wb') as f:
+            pickle.dump({'scaler_key': self._scaler_key(), 'training': self.training}, f)
+
+    @classmethod
+    def load(cls, scaler, path='model/case_index.pkl'):
+        """Load the snapshot and replay saved cases; returns None if it is missing or stale"""
+        case_base = cls(scaler, path)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot['scaler_key'] != case_base._scaler_key():
+            return None
+        case_base.training = snapshot['training']
+        case_base.replay_log()
+        return case_base
+
+    def replay_log(self):
+        """Index every saved case recorded in the on-disk log"""
+        if not os.path.exists(self.log_path):
+            return
+        records = np.fromfile(self.log_path, dtype=self.record)
+        for user_id in np.unique(records['user_id']):
+            rows = records[records['user_id'] == user_id]
+            self._user_index(int(user_id)).add(
+                self.scaler.transform(rows['x'].astype(float)), rows['label'], rows['id']
+            )
+
+    def _user_index(self, user_id):
+        if user_id not in self.users:
+            self.users[user_id] = CaseIndex(self.n_features)
+        return self.users[user_id]
+
+    def needs_user(self, user_id):
+        return user_id not in self.loaded_users
+
+    def forget_user(self, user_id):
+        """Reload the user's saved cases from the database on their next query, e.g. after a confirmed outcome"""
+        with self.lock:
+            self.loaded_users.discard(user_id)
+
+    def load_user(self, user_id, X, labels, ids, confirmed):
+        """
+        Index a user's saved predictions (raw vectors) from the database, keeping
+        any logged cases the database didn't return (e.g. archived ones)
+        """
+        index = CaseIndex(self.n_features)
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids):
+            index.add(self.scaler.transform(np.asarray(X, dtype=float)), labels, ids)
+        with self.lock:
+            if user_id in self.users:
+                old_X, old_labels, old_ids = self.users[user_id].rows()
+                keep = ~np.isin(old_ids, ids)
+                if keep.any():
+                    index.add(old_X[keep], old_labels[keep], old_ids[keep])
+            self.users[user_id] = index
+            self.confirmed[user_id] = {int(i) for i, c in zip(ids, confirmed) if c}
+            self.loaded_users.add(user_id)
+
+    def add_case(self, user_id, case_id, x, label):
+        """Index one saved prediction and append it to the on-disk log"""
+        x = np.asarray(x, dtype=float).reshape(1, -1)
+        record = np.zeros(1, dtype=self.record)
+        record['user_id'], record['id'], record['label'], record['x'] = user_id, case_id, label, x
+
+        with self.lock:
+            self._user_index(user_id).add(self.scaler.transform(x), [label], [case_id])
+            with open(self.log_path, 'ab') as f:
+                f.write(record.tobytes())
+
+    def query(self, x, user_id=None, k=5):
+        """
+        Return the k most similar cases as a list of dicts, closest first.
+
+        Training cases are always searched; saved predictions only for their owner.
+        """
+        x_scaled = self.scaler.transform(np.asarray(x, dtype=float).reshape(1, -1))
+        results = []
+
+        with self.lock:
+            d, labels, ids = self.training.query(x_scaled, k)
+            results += [
+                {'source': 'training', 'id': int(i), 'diagnosis': LABELS[int(l)], 'distance': float(dist)}
+                for dist, l, i in zip(d, labels, ids)
+            ]
+            if user_id in self.users:
+                d, labels, ids = self.users[user_id].query(x_scaled, k)
+                confirmed = self.confirmed.get(user_id, set())
+                results += [
+                    {
+                        'source': 'saved', 'id': int(i), 'diagnosis': LABELS[int(l)], 'distance': float(dist),
+                        'confirmed': int(i) in confirmed,
+                    }
+                    for dist, l, i in zip(d, labels, ids)
+                ]
+
+        return sorted(results, key=lambda r: r['distance'])[:k]
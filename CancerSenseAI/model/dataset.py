@@ -0,0 +1,172 @@
+"""
+Compiled, memory-mapped copy of the training data.
+
+The CSV is parsed once into a float32 feature matrix and an int8 label vector,
+stored as .npy files, with a small JSON metadata file that records the
+column names and the source file's hash. Training and the app open the
+arrays with mmap, so several worker processes share one physical copy
+through the page cache and "loading" the dataset costs almost nothing.
+The cache is rebuilt automatically when the source file's hash changes.
+
+Compile ahead of time (optional, it also happens on first use):
+
+    python model/dataset.py data/data.csv
+"""
+import glob
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+FORMAT_VERSION = 1
+LABELS = {'M': 1, 'B': 0}
+
+
+def default_cache_dir(csv_path):
+    return os.path.splitext(csv_path)[0] + ".cache"
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def count_rows(path, block_size=1 << 20):
+    """Data rows in a CSV, i.e. lines after the header"""
+    with open(path, 'rb') as f:
+        lines = sum(block.count(b'\n') for block in iter(lambda: f.read(block_size), b''))
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            lines += 1
+    return lines - 1
+
+
+def feature_columns(columns):
+    return [c for c in columns if c not in ('id', 'diagnosis') and not c.startswith('Unnamed')]
+
+
+def compile_dataset(csv_path, cache_dir=None, chunksize=100_000):
+    """Parse the CSV chunk by chunk straight into .npy files; memory use is bounded by chunksize"""
+    cache_dir = cache_dir or default_cache_dir(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    source_hash = file_hash(csv_path)
+    n_rows = count_rows(csv_path)
+    columns = feature_columns(pd.read_csv(csv_path, nrows=0).columns)
+
+    # Arrays are named after the source hash and meta.json is swapped in last,
+    # so readers always see a matching set even while another process compiles
+    features_file = f"features-{source_hash[:16]}.npy"
+    labels_file = f"labels-{source_hash[:16]}.npy"
+    tmp_suffix = f".{os.getpid()}.tmp"
+    features = np.lib.format.open_memmap(
+        os.path.join(cache_dir, features_file + tmp_suffix), mode='w+', dtype=np.float32, shape=(n_rows, len(columns))
+    )
+    labels = np.lib.format.open_memmap(
+        os.path.join(cache_dir, labels_file + tmp_suffix), mode='w+', dtype=np.int8, shape=(n_rows,)
+    )
+
+    row = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        end = row + len(chunk)
+        features[row:end] = chunk[columns].to_numpy(dtype=np.float32)
+        labels[row:end] = chunk['diagnosis'].map(LABELS).to_numpy(dtype=np.int8)
+        row = end
+    if row != n_rows:
+        raise ValueError(f"Expected {n_rows} rows in {csv_path}, parsed {row}")
+
+    features.flush()
+    labels.flush()
+    del features, labels
+    for name in (features_file, labels_file):
+        os.replace(os.path.join(cache_dir, name + tmp_suffix), os.path.join(cache_dir, name))
+
+    stat = os.stat(csv_path)
+    meta = {
+        'version': FORMAT_VERSION,
+        'source': os.path.abspath(csv_path),
+        'source_sha256': source_hash,
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'n_rows': n_rows,
+        'columns': columns,
+        'features': features_file,
+        'labels': labels_file,
+    }
+    write_meta(cache_dir, meta)
+
+    # Arrays from older versions of the source; processes still mapping them keep their copy
+    for path in glob.glob(os.path.join(cache_dir, "*.npy")):
+        if os.path.basename(path) not in (features_file, labels_file):
+            os.remove(path)
+    return meta
+
+
+def write_meta(cache_dir, meta):
+    tmp_path = os.path.join(cache_dir, f"meta.json.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(cache_dir, "meta.json"))
+
+
+def read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(meta, csv_path, cache_dir):
+    """
+    Whether the cache was built from the current contents of csv_path.
+
+    Size and mtime are checked first, so the common case never rereads the
+    source. If they changed, the hash decides, so touching the file alone
+    doesn't force a rebuild.
+    """
+    if meta is None or meta.get('version') != FORMAT_VERSION:
+        return False
+    stat = os.stat(csv_path)
+    if (meta['source_size'], meta['source_mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+        return True
+    if stat.st_size != meta['source_size'] or file_hash(csv_path) != meta['source_sha256']:
+        return False
+    write_meta(cache_dir, dict(meta, source_mtime_ns=stat.st_mtime_ns))
+    return True
+
+
+def open_dataset(csv_path="data/data.csv", cache_dir=None):
+    """Return (features, labels, meta), compiling the cache first if it is missing or stale"""
+    cache_dir = cache_dir or default_cache_dir(csv_path)
+    meta = read_meta(cache_dir)
+    if not is_current(meta, csv_path, cache_dir):
+        meta = compile_dataset(csv_path, cache_dir)
+
+    features = np.load(os.path.join(cache_dir, meta['features']), mmap_mode='r')
+    labels = np.load(os.path.join(cache_dir, meta['labels']), mmap_mode='r')
+    return features, labels, meta
+
+
+def load_clean_data(csv_path="data/data.csv", cache_dir=None):
+    """
+    Same frame as the old pandas-based get_clean_data (diagnosis as 0/1 plus
+    the feature columns) but backed by the read-only memory-mapped arrays.
+    """
+    features, labels, meta = open_dataset(csv_path, cache_dir)
+    data = pd.DataFrame(features, columns=meta['columns'], copy=False)
+    data.insert(0, 'diagnosis', labels)
+    return data
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:] or ["data/data.csv"]:
+        meta = compile_dataset(path)
+        print(f"{path}: {meta['n_rows']} rows x {len(meta['columns'])} features -> {default_cache_dir(path)}")
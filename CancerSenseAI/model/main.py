@@ -1,4 +1,3 @@
-import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
@@ -6,8 +5,15 @@ from sklearn.metrics import accuracy_score, classification_report
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.svm import SVC
 from sklearn.neural_network import MLPClassifier
+import os
 import pickle as pickle
+import sys
 import numpy as np
+from case_index import CaseBase
+from dataset import load_clean_data
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from explain import get_background
 
 
 def compare_models(X_train, X_test, y_train, y_test):
@@ -34,7 +40,7 @@ def compare_models(X_train, X_test, y_train, y_test):
     print("\nBest performing model:", best_model[0])
     print("="*50 + "\n")
     
-    return models[best_model[0]]
+    return best_model[0], models
 
 
 def create_model(data): 
@@ -51,7 +57,8 @@ def create_model(data):
   )
   
   # Compare different models
-  best_model = compare_models(X_train, X_test, y_train, y_test)
+  best_name, models = compare_models(X_train, X_test, y_train, y_test)
+  best_model = models[best_name]
   
   # Train the best model again for final evaluation
   best_model.fit(X_train, y_train)
@@ -61,15 +68,15 @@ def create_model(data):
   print("-"*50)
   print(classification_report(y_test, y_pred))
   
-  return best_model, scaler
+  # the runners-up are kept as shadow challengers for the app
+  challengers = {name: model for name, model in models.items() if name != best_name}
+  
+  return best_model, scaler, challengers
 
 
 def get_clean_data():
-  data = pd.read_csv("data/data.csv")
-  
-  data = data.drop(['Unnamed: 32', 'id'], axis=1)
-  
-  data['diagnosis'] = data['diagnosis'].map({ 'M': 1, 'B': 0 })
+  # memory-mapped float32 copy of the CSV, recompiled whenever the file changes
+  data = load_clean_data("data/data.csv")
   
   return data
 
@@ -77,13 +84,28 @@ def get_clean_data():
 def main():
   data = get_clean_data()
 
-  model, scaler = create_model(data)
+  model, scaler, challengers = create_model(data)
+  # fixed sample of scaled training rows used by the app to explain predictions
+  background = get_background(scaler, data.drop(['diagnosis'], axis=1).values)
 
   with open('model/model.pkl', 'wb') as f:
     pickle.dump(model, f)
     
   with open('model/scaler.pkl', 'wb') as f:
     pickle.dump(scaler, f)
+
+  with open('model/background.pkl', 'wb') as f:
+    pickle.dump(background, f)
+
+  # each challenger carries the scaler it was trained with, so a later retrain
+  # that replaces scaler.pkl can't change what the shadows are scored on
+  with open('model/challengers.pkl', 'wb') as f:
+    pickle.dump({name: {'model': m, 'scaler': scaler} for name, m in challengers.items()}, f)
+
+  # index the training cases for similar-case retrieval in the app
+  case_base = CaseBase(scaler)
+  case_base.build(data.drop(['diagnosis'], axis=1).values, data['diagnosis'].values)
+  case_base.save()
   
 
 if __name__ == '__main__':
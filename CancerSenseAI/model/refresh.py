@@ -0,0 +1,190 @@
+"""
+Incremental model refresh from confirmed outcomes.
+
+Clinicians attach the confirmed diagnosis to saved predictions from the
+History view. This job picks up only the outcomes confirmed since its last
+run and updates a copy of the live model with them. Fitting on a handful of
+new rows alone makes a model forget its training data, so every update also
+replays a random sample (`--replay`) of the training split of data/data.csv:
+
+  * models with partial_fit (the streaming-trained ones) get one more partial_fit,
+  * Random Forest grows extra trees (warm_start),
+  * Logistic Regression is refitted, warm-started from its current weights.
+
+The updated copy is scored on the same held-out 20% of data/data.csv that
+create_model evaluates on. It is published over model/model.pkl only if
+its accuracy is no worse. The app notices the new file on its next rerun.
+A rejected batch is not retried: the watermark moves past it either way,
+and its ids are recorded in model/refresh_state.json for review.
+
+Meant to run on a schedule, e.g. nightly from cron in the project root:
+
+    0 2 * * * cd /path/to/CancerSenseAI && python model/refresh.py
+"""
+import argparse
+import copy
+import datetime
+import json
+import os
+import pickle as pickle
+import sys
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, log_loss
+from sklearn.model_selection import train_test_split
+
+from dataset import load_clean_data
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from database import Database
+
+
+STATE_PATH = 'model/refresh_state.json'
+VERSIONS_DIR = 'model/versions'
+LABELS = {'Benign': 0, 'Malignant': 1}
+
+
+def load_state():
+  if not os.path.exists(STATE_PATH):
+    return {'version': 0, 'confirmed_at': None, 'last_id': 0, 'runs': []}
+  with open(STATE_PATH) as f:
+    return json.load(f)
+
+
+def save_state(state):
+  tmp_path = STATE_PATH + '.tmp'
+  with open(tmp_path, 'w') as f:
+    json.dump(state, f, indent=2)
+  os.replace(tmp_path, STATE_PATH)
+
+
+def get_split(scaler):
+  # the exact split create_model trains and evaluates on
+  data = load_clean_data("data/data.csv")
+  X = scaler.transform(data.drop(['diagnosis'], axis=1))
+  X_train, X_test, y_train, y_test = train_test_split(X, data['diagnosis'], test_size=0.2, random_state=42)
+  return X_train, X_test, np.asarray(y_train, dtype=int), y_test
+
+
+def replay_sample(X_train, y_train, size, seed):
+  rng = np.random.default_rng(seed)
+  index = rng.choice(len(X_train), size=min(size, len(X_train)), replace=False)
+  return X_train[index], y_train[index]
+
+
+def get_new_rows(db, state, columns, limit):
+  rows = db.get_confirmed_since(state['confirmed_at'], state['last_id'], limit)
+  X = np.array([[json.loads(input_data)[c] for c in columns] for _, input_data, _, _ in rows]).reshape(-1, len(columns))
+  y = np.array([LABELS[diagnosis] for _, _, diagnosis, _ in rows], dtype=int)
+  return X, y, rows
+
+
+def update_model(model, X, y, X_replay, y_replay, extra_trees):
+  """Return an updated copy of model trained on the new rows plus the replayed training rows"""
+  model = copy.deepcopy(model)
+  X, y = np.vstack([X_replay, X]), np.concatenate([y_replay, y])
+
+  if hasattr(model, 'partial_fit'):
+    model.partial_fit(X, y, classes=np.array([0, 1]))
+    return model
+
+  if len(np.unique(y)) < 2:
+    raise ValueError("need both diagnoses among the rows to update this model, raise --replay")
+
+  if isinstance(model, RandomForestClassifier):
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + extra_trees)
+    model.fit(X, y)
+  elif isinstance(model, LogisticRegression):
+    model.set_params(warm_start=True)
+    model.fit(X, y)
+  else:
+    raise ValueError(f"{type(model).__name__} can't be updated incrementally, retrain with model/main.py")
+  return model
+
+
+def evaluate(model, X, y):
+  return accuracy_score(y, model.predict(X)), log_loss(y, model.predict_proba(X), labels=[0, 1])
+
+
+def publish(model, version):
+  os.makedirs(VERSIONS_DIR, exist_ok=True)
+  with open(os.path.join(VERSIONS_DIR, f'model-v{version}.pkl'), 'wb') as f:
+    pickle.dump(model, f)
+
+  # swap the live file in one step so the app never reads a half-written pickle
+  with open('model/model.pkl.tmp', 'wb') as f:
+    pickle.dump(model, f)
+  os.replace('model/model.pkl.tmp', 'model/model.pkl')
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Update the live model from newly confirmed outcomes")
+  parser.add_argument('--limit', type=int, default=None, help='maximum confirmed rows to use in one run')
+  parser.add_argument('--extra-trees', type=int, default=10, help='trees added per run for Random Forest')
+  parser.add_argument('--replay', type=int, default=200, help='training rows replayed alongside the new ones')
+  parser.add_argument('--dry-run', action='store_true', help='evaluate the update without publishing it')
+  args = parser.parse_args()
+
+  with open('model/model.pkl', 'rb') as f:
+    model = pickle.load(f)
+  with open('model/scaler.pkl', 'rb') as f:
+    scaler = pickle.load(f)
+
+  state = load_state()
+  db = Database()
+  db.ensure_feedback_columns()
+
+  columns = list(load_clean_data("data/data.csv").columns.drop('diagnosis'))
+  X_new, y_new, rows = get_new_rows(db, state, columns, args.limit)
+  if not rows:
+    print("No newly confirmed outcomes since the last run.")
+    return
+  print(f"{len(rows)} newly confirmed outcomes ({int(y_new.sum())} malignant)")
+
+  X_train, X_test, y_train, y_test = get_split(scaler)
+  X_replay, y_replay = replay_sample(X_train, y_train, args.replay, seed=state['last_id'])
+  old_accuracy, old_loss = evaluate(model, X_test, y_test)
+  try:
+    candidate = update_model(model, scaler.transform(X_new), y_new, X_replay, y_replay, args.extra_trees)
+  except ValueError as e:
+    print(f"Update skipped: {e}")
+    return
+  new_accuracy, new_loss = evaluate(candidate, X_test, y_test)
+
+  print(f"Held-out accuracy: {old_accuracy:.2%} -> {new_accuracy:.2%}")
+  print(f"Held-out log loss: {old_loss:.4f} -> {new_loss:.4f}")
+
+  accepted = new_accuracy >= old_accuracy
+  run = {
+    'time': datetime.datetime.now().isoformat(timespec='seconds'),
+    'rows': len(rows),
+    'old_accuracy': old_accuracy,
+    'new_accuracy': new_accuracy,
+    'published': accepted and not args.dry_run,
+  }
+
+  if args.dry_run:
+    print("Dry run: update not published.")
+    return
+
+  if not accepted:
+    # set the batch aside rather than retrying it (and everything after it) on every run
+    run['rejected_ids'] = [row[0] for row in rows]
+    print("Update rejected: held-out accuracy dropped, keeping the current model. "
+          f"The {len(rows)} rows are listed in {STATE_PATH} and won't be retried.")
+  else:
+    state['version'] += 1
+    publish(candidate, state['version'])
+    run['version'] = state['version']
+    print(f"Published model version {state['version']}.")
+
+  _, _, _, confirmed_at = rows[-1]
+  state['confirmed_at'], state['last_id'] = str(confirmed_at), rows[-1][0]
+  state['runs'].append(run)
+  save_state(state)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,176 @@
+"""
+Out-of-core training for datasets that don't fit in memory.
+
+The CSV is compiled once into the memory-mapped cache (see dataset.py) and
+then read back in row chunks, so only one chunk is ever materialized:
+
+  1. StandardScaler.partial_fit over the training rows,
+  2. a few epochs of partial_fit for every incremental candidate model,
+  3. a streaming evaluation over the held-out rows.
+
+Rows go to the held-out stream by a hash of their row number, so the split is
+stable between runs without a shuffle. The winner is exported as
+model/model.pkl and model/scaler.pkl, in the same format the app loads. The
+other models become the shadow challengers, saved with the new scaler. The
+similar-case snapshot indexed with the old scaler is removed, and the app
+rebuilds it on its next start.
+
+    python model/train_streaming.py --data data/big.csv --chunk-size 100000 --epochs 5
+"""
+import argparse
+import os
+import pickle as pickle
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neural_network import MLPClassifier
+from sklearn.preprocessing import StandardScaler
+
+from dataset import open_dataset
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from explain import get_background
+
+
+CLASSES = np.array([0, 1])
+
+
+def candidate_models():
+  # only learners with partial_fit and predict_proba, so the app can use the winner as-is
+  return {
+    'SGD Logistic Regression': SGDClassifier(loss='log_loss', random_state=42),
+    'SGD Modified Huber': SGDClassifier(loss='modified_huber', random_state=42),
+    'Gaussian Naive Bayes': GaussianNB(),
+    'Neural Network': MLPClassifier(random_state=42),
+  }
+
+
+def is_held_out(rows, test_fraction):
+  # multiplicative hash of the row number, so the split needs no shuffle and no state
+  return (rows.astype(np.uint64) * np.uint64(2654435761) % np.uint64(2**32)) < np.uint64(test_fraction * 2**32)
+
+
+def iter_chunks(features, labels, chunk_size, held_out, test_fraction, order=None):
+  """Yield (X, y) for the training or held-out rows of each chunk"""
+  starts = np.arange(0, len(labels), chunk_size)
+  if order is not None:
+    starts = starts[order.permutation(len(starts))]
+  for start in starts:
+    end = min(start + chunk_size, len(labels))
+    mask = is_held_out(np.arange(start, end), test_fraction) == held_out
+    X = np.asarray(features[start:end][mask], dtype=np.float64)
+    y = np.asarray(labels[start:end][mask])
+    if len(y):
+      yield X, y
+
+
+def fit_scaler(features, labels, chunk_size, test_fraction):
+  scaler = StandardScaler()
+  for X, _ in iter_chunks(features, labels, chunk_size, False, test_fraction):
+    scaler.partial_fit(X)
+  return scaler
+
+
+def train_models(models, scaler, features, labels, chunk_size, test_fraction, epochs):
+  rng = np.random.RandomState(42)
+  rows = 0
+  for epoch in range(epochs):
+    # visit the chunks in a different order every epoch
+    for X, y in iter_chunks(features, labels, chunk_size, False, test_fraction, order=rng):
+      X = scaler.transform(X)
+      for model in models.values():
+        model.partial_fit(X, y, classes=CLASSES)
+      rows += len(y)
+  return rows
+
+
+def evaluate_models(models, scaler, features, labels, chunk_size, test_fraction):
+  """Confusion matrix per model ([true][predicted]) accumulated over the held-out stream"""
+  confusion = {name: np.zeros((2, 2), dtype=np.int64) for name in models}
+  for X, y in iter_chunks(features, labels, chunk_size, True, test_fraction):
+    X = scaler.transform(X)
+    for name, model in models.items():
+      np.add.at(confusion[name], (y, model.predict(X)), 1)
+  return confusion
+
+
+def print_report(confusion):
+  tn, fp, fn, tp = confusion.ravel()
+  for label, correct, predicted, actual in (('Benign', tn, tn + fn, tn + fp), ('Malignant', tp, tp + fp, tp + fn)):
+    precision = correct / predicted if predicted else 0.0
+    recall = correct / actual if actual else 0.0
+    print(f"{label:<12} precision {precision:.2f}  recall {recall:.2f}  support {actual}")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Train incrementally on a dataset larger than memory")
+  parser.add_argument('--data', default='data/data.csv', help='CSV in the same layout as data/data.csv')
+  parser.add_argument('--chunk-size', type=int, default=100_000, help='rows materialized at a time')
+  parser.add_argument('--epochs', type=int, default=5, help='passes over the training rows')
+  parser.add_argument('--test-fraction', type=float, default=0.2, help='share of rows held out for evaluation')
+  args = parser.parse_args()
+
+  tracemalloc.start()
+  start = time.perf_counter()
+
+  features, labels, meta = open_dataset(args.data)
+  compiled = time.perf_counter()
+
+  scaler = fit_scaler(features, labels, args.chunk_size, args.test_fraction)
+  scaled = time.perf_counter()
+
+  models = candidate_models()
+  trained_rows = train_models(models, scaler, features, labels, args.chunk_size, args.test_fraction, args.epochs)
+  trained = time.perf_counter()
+
+  confusion = evaluate_models(models, scaler, features, labels, args.chunk_size, args.test_fraction)
+  evaluated = time.perf_counter()
+
+  print("\n" + "="*50)
+  print("STREAMING MODEL COMPARISON")
+  print("="*50)
+  accuracy = {name: np.trace(c) / c.sum() for name, c in confusion.items()}
+  for name, value in accuracy.items():
+    print(f"{name} Accuracy: {value:.2%}")
+  best = max(accuracy, key=accuracy.get)
+  print("\nBest performing model:", best)
+  print("="*50 + "\n")
+  print_report(confusion[best])
+
+  with open('model/model.pkl', 'wb') as f:
+    pickle.dump(models[best], f)
+
+  with open('model/scaler.pkl', 'wb') as f:
+    pickle.dump(scaler, f)
+
+  # random sample of scaled rows for the app's explanations, drawn like model/main.py does
+  with open('model/background.pkl', 'wb') as f:
+    pickle.dump(get_background(scaler, features), f)
+
+  # the previous challengers and case index were built against the scaler just replaced
+  with open('model/challengers.pkl', 'wb') as f:
+    pickle.dump({name: {'model': m, 'scaler': scaler} for name, m in models.items() if name != best}, f)
+  if os.path.exists('model/case_index.pkl'):
+    os.remove('model/case_index.pkl')
+    print("Removed model/case_index.pkl (old scaler); the app rebuilds it on its next start.")
+
+  _, peak_heap = tracemalloc.get_traced_memory()
+  peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+  n_rows = meta['n_rows']
+  print("\nThroughput")
+  print("-"*50)
+  print(f"Rows: {n_rows}, chunk size {args.chunk_size}, {args.epochs} epochs")
+  print(f"Open/compile cache: {compiled - start:.1f} s")
+  print(f"Scaler pass:        {scaled - compiled:.1f} s ({n_rows / max(scaled - compiled, 1e-9):,.0f} rows/s)")
+  print(f"Training:           {trained - scaled:.1f} s ({trained_rows / max(trained - scaled, 1e-9):,.0f} rows/s over {len(models)} models)")
+  print(f"Evaluation:         {evaluated - trained:.1f} s")
+  print(f"Peak Python heap: {peak_heap / 2**20:.1f} MiB, peak RSS: {peak_rss:.1f} MiB (includes mapped pages)")
+
+
+if __name__ == '__main__':
+  main()